@@ -0,0 +1,235 @@
+"""
+Массовый импорт и экспорт рецептов в формате NDJSON: одна строка —
+один рецепт. Теги передаются slug'ами, ингредиенты — парой
+(название, единица измерения), автор — email'ом, поэтому файл можно
+перенести между базами с разными id.
+"""
+import base64
+import itertools
+import mimetypes
+
+import orjson
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from recipes.models import (ChangeLogEntry, Ingredient, IngredientsInRecipe,
+                            Recipe, Tag, TagsInRecipe)
+from recipes.similarity import schedule_update
+from users.feed import schedule_fan_out
+from users.models import User
+from .serializers import RecipeImportSerializer
+from .sync import log_recipes
+from .utils import GroupConcat
+
+MAX_REPORTED_ERRORS = 100
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def encode_image(image):
+    """
+    Картинка как data URI. Отсутствующий или недопустимый файл
+    выгружается пустой строкой: ответ уже отправляется, и ошибка
+    посреди потока оборвала бы файл выгрузки.
+    """
+    if not image:
+        return ''
+    content_type = mimetypes.guess_type(image.name)[0] or 'image/png'
+    try:
+        with image.open('rb') as f:
+            data = base64.b64encode(f.read()).decode()
+    except (OSError, SuspiciousFileOperation):
+        return ''
+    return f'data:{content_type};base64,{data}'
+
+
+def export_recipes(queryset, embed_images=False):
+    """
+    Генератор строк NDJSON. Рецепты читаются итератором (на PostgreSQL —
+    серверным курсором), ингредиенты догружаются одним запросом
+    на порцию, так что память не зависит от размера выгрузки.
+    """
+    chunk_size = settings.RECIPE_BULK['EXPORT_CHUNK_SIZE']
+    recipes = queryset.annotate(
+        tag_slugs=Subquery(
+            TagsInRecipe.objects
+            .filter(recipe=OuterRef('pk'))
+            .values('recipe')
+            .annotate(slugs=GroupConcat('tags__slug'))
+            .values('slugs')
+        )
+    ).select_related('author').only(
+        'id', 'name', 'text', 'cooking_time', 'image', 'author__email'
+    ).order_by('id').iterator(chunk_size=chunk_size)
+
+    for batch in batched(recipes, chunk_size):
+        ingredients = {}
+        for item in IngredientsInRecipe.objects.filter(
+                recipe__in=[recipe.pk for recipe in batch]
+        ).order_by('id').values(
+            'recipe_id', 'amount', 'ingredient__name',
+            'ingredient__measurement_unit'
+        ):
+            ingredients.setdefault(item['recipe_id'], []).append({
+                'name': item['ingredient__name'],
+                'measurement_unit': item['ingredient__measurement_unit'],
+                'amount': item['amount'],
+            })
+        lines = []
+        for recipe in batch:
+            lines.append(orjson.dumps({
+                'id': recipe.pk,
+                'author': recipe.author.email,
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': (
+                    encode_image(recipe.image) if embed_images
+                    else recipe.image.name
+                ),
+                'tags': (
+                    recipe.tag_slugs.split(',') if recipe.tag_slugs else []
+                ),
+                'ingredients': ingredients.get(recipe.pk, []),
+            }))
+        yield b'\n'.join(lines) + b'\n'
+
+
+def validate_batch(batch):
+    """
+    Проверка порции без обращения к БД, затем разрешение тегов,
+    ингредиентов и авторов тремя запросами на всю порцию.
+    """
+    valid = []
+    errors = []
+    for line_number, line in batch:
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError as exc:
+            errors.append({'line': line_number, 'errors': str(exc)})
+            continue
+        serializer = RecipeImportSerializer(data=record)
+        if serializer.is_valid():
+            valid.append((line_number, serializer.validated_data))
+        else:
+            errors.append({'line': line_number, 'errors': serializer.errors})
+
+    slugs = set()
+    ingredient_names = set()
+    emails = set()
+    for _, data in valid:
+        slugs.update(data['tags'])
+        ingredient_names.update(item['name'] for item in data['ingredients'])
+        if data.get('author'):
+            emails.add(data['author'])
+    tags = dict(
+        Tag.objects.filter(slug__in=slugs).values_list('slug', 'id')
+    )
+    ingredients = {
+        (name, unit): pk
+        for pk, name, unit in Ingredient.objects.filter(
+            name__in=ingredient_names
+        ).values_list('id', 'name', 'measurement_unit')
+    }
+    authors = dict(
+        User.objects.filter(email__in=emails).values_list('email', 'id')
+    )
+
+    resolved = []
+    for line_number, data in valid:
+        record_errors = {}
+        missing_tags = [slug for slug in data['tags'] if slug not in tags]
+        if missing_tags:
+            record_errors['tags'] = f'Неизвестные теги: {missing_tags}'
+        missing_ingredients = [
+            item['name'] for item in data['ingredients']
+            if (item['name'], item['measurement_unit']) not in ingredients
+        ]
+        if missing_ingredients:
+            record_errors['ingredients'] = (
+                f'Неизвестные ингредиенты: {missing_ingredients}'
+            )
+        if data.get('author') and data['author'] not in authors:
+            record_errors['author'] = (
+                f'Неизвестный автор: {data["author"]}'
+            )
+        if record_errors:
+            errors.append({'line': line_number, 'errors': record_errors})
+            continue
+        data['tag_ids'] = [tags[slug] for slug in data['tags']]
+        data['ingredient_ids'] = [
+            (ingredients[(item['name'], item['measurement_unit'])],
+             item['amount'])
+            for item in data['ingredients']
+        ]
+        data['author_id'] = authors.get(data.get('author'))
+        resolved.append(data)
+    return resolved, errors
+
+
+def write_batch(records, default_author):
+    with transaction.atomic():
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author_id=data['author_id'] or default_author.pk,
+                name=data['name'],
+                text=data['text'],
+                cooking_time=data['cooking_time'],
+                image=data.get('image') or '',
+            )
+            for data in records
+        )
+        IngredientsInRecipe.objects.bulk_create(
+            IngredientsInRecipe(
+                recipe_id=recipe.pk, ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for recipe, data in zip(recipes, records)
+            for ingredient_id, amount in data['ingredient_ids']
+        )
+        TagsInRecipe.objects.bulk_create(
+            TagsInRecipe(recipe_id=recipe.pk, tags_id=tag_id)
+            for recipe, data in zip(recipes, records)
+            for tag_id in data['tag_ids']
+        )
+        log_recipes(
+            (recipe.pk for recipe in recipes), ChangeLogEntry.CREATE
+        )
+        # bulk_create не вызывает post_save, ленты раскладываются явно
+        schedule_fan_out(
+            (recipe.pk, recipe.author_id) for recipe in recipes
+        )
+        schedule_update(recipe.pk for recipe in recipes)
+    return len(recipes)
+
+
+def import_recipes(lines, default_author):
+    """
+    Загрузка рецептов из итерируемого набора строк NDJSON порциями.
+    Ошибочные записи пропускаются и попадают в отчёт.
+    """
+    created = 0
+    error_count = 0
+    errors = []
+    numbered = (
+        (line_number, line)
+        for line_number, line in enumerate(lines, start=1)
+        if line.strip()
+    )
+    for batch in batched(numbered, settings.RECIPE_BULK['BATCH_SIZE']):
+        records, batch_errors = validate_batch(batch)
+        if records:
+            created += write_batch(records, default_author)
+        batch_errors.sort(key=lambda error: error['line'])
+        error_count += len(batch_errors)
+        errors.extend(batch_errors[:MAX_REPORTED_ERRORS - len(errors)])
+    return {'created': created, 'failed': error_count, 'errors': errors}
@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.db.models.expressions import Combinable
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from recipes.models import Ingredient, Recipe, Tag
+from .slow_queries import recording
+from .sync import log_recipes
+
+TAGS_KEY = 'tags:all'
+TAGS_TIMEOUT = 300
+VERSION_BATCH_SIZE = 1000
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='recipe-versions'
+        )
+    return _executor
+
+
+def get_tags():
+    """Все теги в сериализованном виде, {id: данные тега}."""
+    tags = cache.get(TAGS_KEY)
+    if tags is None:
+        tags = {
+            tag['id']: tag
+            for tag in Tag.objects.values('id', 'name', 'color', 'slug')
+        }
+        cache.set(TAGS_KEY, tags, TAGS_TIMEOUT)
+    return tags
+
+
+def fragment_key(recipe_id, version):
+    # Префикс меняется вместе с форматом фрагмента
+    return f'recipe-fragment:2:{recipe_id}:{version}'
+
+
+def get_recipe_fragments(recipes, build):
+    """
+    Не зависящие от пользователя части рецептов по ключу (id, version)
+    одним get_many. Отсутствующие строит build(recipes), который
+    возвращает пары (рецепт, фрагмент).
+    """
+    keys = {recipe.pk: fragment_key(recipe.pk, recipe.version)
+            for recipe in recipes}
+    cached = cache.get_many(keys.values())
+    fragments = {}
+    missing = []
+    for recipe in recipes:
+        fragment = cached.get(keys[recipe.pk])
+        if fragment is None:
+            missing.append(recipe)
+        else:
+            fragments[recipe.pk] = fragment
+    if not missing:
+        return fragments
+
+    built = {}
+    for recipe, fragment in build(missing):
+        fragments[recipe.pk] = fragment
+        built[fragment_key(recipe.pk, recipe.version)] = fragment
+    cache.set_many(built, settings.RECIPE_FRAGMENT_TIMEOUT)
+    return fragments
+
+
+def bump_recipe_versions(queryset, batch_size=VERSION_BATCH_SIZE):
+    """
+    Новая версия рецептов queryset и записи в журнал изменений:
+    пакетами по batch_size, один UPDATE и один INSERT на пакет.
+    """
+    pks = queryset.values_list('id', flat=True).order_by('id').distinct()
+    last = 0
+    while True:
+        batch = list(pks.filter(id__gt=last)[:batch_size])
+        if not batch:
+            return
+        with transaction.atomic():
+            Recipe.objects.filter(id__in=batch).update(
+                version=F('version') + 1
+            )
+            log_recipes(batch)
+        last = batch[-1]
+
+
+def _bump_ingredient_recipes(ingredient_id):
+    close_old_connections()
+    try:
+        with recording('cache.bump_recipe_versions'):
+            bump_recipe_versions(Recipe.objects.filter(
+                ingredients_in_recipe__ingredient=ingredient_id
+            ))
+    finally:
+        close_old_connections()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(sender, instance, **kwargs):
+    cache.delete(TAGS_KEY)
+
+
+@receiver(pre_save, sender=Recipe)
+def increase_recipe_version(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance.version = F('version') + 1
+
+
+@receiver(post_save, sender=Recipe)
+def reload_recipe_version(sender, instance, **kwargs):
+    if isinstance(instance.version, Combinable):
+        instance.refresh_from_db(fields=('version',))
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_recipes(sender, instance, created, **kwargs):
+    # У популярного ингредиента тысячи рецептов: версии меняются
+    # в фоне после фиксации, а не внутри запроса админки
+    if not created:
+        task = partial(_bump_ingredient_recipes, instance.pk)
+        transaction.on_commit(lambda: get_executor().submit(task))
@@ -0,0 +1,153 @@
+import logging
+import random
+import time
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+_routing = Local()
+
+
+class ConnectionMetrics:
+    """Счётчики получения соединений с БД в текущем процессе."""
+    def __init__(self):
+        self.requests = 0
+        self.reused = 0
+        self.opened = 0
+        self.broken = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_open(self, seconds):
+        self.opened += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'reused': self.reused,
+            'opened': self.opened,
+            'broken': self.broken,
+            'wait_avg_ms': (
+                self.wait_total / self.opened * 1000 if self.opened else 0
+            ),
+            'wait_max_ms': self.wait_max * 1000,
+        }
+
+
+metrics = ConnectionMetrics()
+
+
+def check_connection(**kwargs):
+    """
+    Вызывается на request_started после close_old_connections Django.
+    Соединение здесь не открывается: проверка постоянного соединения
+    и замер получения нового выполняются при первом обращении к БД
+    в запросе, запросы без БД её не трогают.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    metrics.requests += 1
+    if not hasattr(connection, 'check_pending'):
+        instrument(connection)
+    connection.check_pending = True
+    if metrics.requests % settings.DB_CONN_METRICS_EVERY == 0:
+        logger.info('Database connection metrics: %s', metrics.as_dict())
+
+
+def instrument(connection):
+    """Оборачивает ensure_connection соединения текущего потока."""
+    ensure_connection = connection.ensure_connection
+
+    def checked_ensure_connection():
+        if connection.check_pending:
+            connection.check_pending = False
+            acquire_connection(connection, ensure_connection)
+        else:
+            ensure_connection()
+    connection.ensure_connection = checked_ensure_connection
+
+
+def acquire_connection(connection, ensure_connection):
+    """
+    Проверяет постоянное соединение перед переиспользованием
+    и замеряет время получения нового соединения (включая ожидание
+    в очереди пулера).
+    """
+    if connection.connection is not None:
+        if (
+            connection.settings_dict.get('CONN_HEALTH_CHECKS')
+            and not connection.is_usable()
+        ):
+            metrics.broken += 1
+            connection.close()
+        else:
+            metrics.reused += 1
+            return
+
+    start = time.perf_counter()
+    ensure_connection()
+    wait = time.perf_counter() - start
+    metrics.record_open(wait)
+
+    if wait * 1000 > settings.DB_CONN_SLOW_MS:
+        logger.warning('Slow database connection: %.1f ms', wait * 1000)
+
+
+def get_replicas():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def sticky_key(user_id):
+    return f'db-sticky:{user_id}'
+
+
+def begin_request():
+    _routing.use_replica = False
+    _routing.written = False
+
+
+def use_replica_for(user):
+    """
+    Разрешает чтение с реплики до конца запроса, если пользователь
+    недавно ничего не записывал.
+    """
+    if not get_replicas():
+        return
+    if user.is_authenticated and cache.get(sticky_key(user.pk)):
+        return
+    _routing.use_replica = True
+
+
+def end_request(user):
+    """После записи пользователь на время читает только с primary."""
+    if getattr(_routing, 'written', False) and user.is_authenticated:
+        cache.set(
+            sticky_key(user.pk), True, settings.DB_REPLICA_STICKY_SECONDS
+        )
+    begin_request()
+
+
+class ReplicaRouter:
+    """
+    Читает с реплики только в запросах, где это явно разрешено
+    use_replica_for(), и только пока в запросе не было записи.
+    """
+    def db_for_read(self, model, **hints):
+        if (
+            getattr(_routing, 'use_replica', False)
+            and not getattr(_routing, 'written', False)
+        ):
+            return random.choice(get_replicas())
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _routing.written = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
@@ -0,0 +1,170 @@
+"""
+Удаление рецептов и пользователей с большим числом связей. Связанные
+строки удаляются пакетами по первичному ключу одним DELETE на пакет,
+без загрузки объектов и без сигналов на каждую строку: время запроса
+и память ограничены размером пакета при любом числе связей. Побочные
+эффекты сигналов (журнал изменений, кэш подписок) выполняются
+на весь пакет сразу. Сам объект удаляется последним обычным delete().
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, models, router, transaction
+from django.db.models.deletion import get_candidate_relations_to_delete
+from rest_framework.authtoken.models import Token
+
+from recipes.models import ChangeLogEntry, Follow, Recipe
+from users.cache import following_key
+from users.models import User
+from .slow_queries import recording
+from .sync import USER_KINDS, log_recipes
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.DELETION['WORKERS'],
+            thread_name_prefix='deletion'
+        )
+    return _executor
+
+
+def log_relations(model, pks):
+    """Записи об удалении избранного, корзины и подписок в журнал."""
+    kind, field = USER_KINDS[model]
+    rows = list(model._base_manager.filter(pk__in=pks).values_list(
+        'user_id', field
+    ))
+    ChangeLogEntry.objects.bulk_create(
+        ChangeLogEntry(user_id=user_id, kind=kind, object_id=object_id,
+                       op=ChangeLogEntry.DELETE)
+        for user_id, object_id in rows
+    )
+    if model is Follow:
+        cache.delete_many(
+            [following_key(user_id) for user_id in {row[0] for row in rows}]
+        )
+
+
+BATCH_HOOKS = {
+    Recipe: partial(log_recipes, op=ChangeLogEntry.DELETE),
+    **{model: partial(log_relations, model) for model in USER_KINDS},
+}
+
+
+def cascade_relations(model):
+    """Обратные связи с on_delete=CASCADE: (модель, имя поля)."""
+    return [
+        (relation.related_model, relation.field.name)
+        for relation in get_candidate_relations_to_delete(model._meta)
+        if relation.on_delete is models.CASCADE
+    ]
+
+
+def delete_rows(queryset, batch_size):
+    """
+    Удаляет строки queryset и всё, что на них ссылается каскадом,
+    снизу вверх пакетами по batch_size. Возвращает число строк.
+    """
+    model = queryset.model
+    deleted = 0
+    for related, field in cascade_relations(model):
+        deleted += delete_rows(
+            related._base_manager.filter(
+                **{f'{field}__in': queryset.values('pk')}
+            ),
+            batch_size
+        )
+    pks = queryset.values_list('pk', flat=True).order_by()
+    hook = BATCH_HOOKS.get(model)
+    while True:
+        batch = list(pks[:batch_size])
+        if not batch:
+            return deleted
+        with transaction.atomic():
+            if hook is not None:
+                hook(batch)
+            deleted += model._base_manager.filter(pk__in=batch)._raw_delete(
+                router.db_for_write(model)
+            )
+
+
+def delete_object(model, pk, batch_size=None):
+    """
+    Полное удаление объекта: связи пакетами, затем сам объект через
+    delete(), чтобы сработали его собственные сигналы.
+    """
+    batch_size = batch_size or settings.DELETION['BATCH_SIZE']
+    instance = model._base_manager.filter(pk=pk).first()
+    if instance is None:
+        return 0
+    deleted = 0
+    for related, field in cascade_relations(model):
+        deleted += delete_rows(
+            related._base_manager.filter(**{field: pk}), batch_size
+        )
+    return deleted + instance.delete()[0]
+
+
+def _run(model, pk):
+    close_old_connections()
+    try:
+        with recording('deletion.delete_object'):
+            delete_object(model, pk)
+    finally:
+        close_old_connections()
+
+
+def tombstone(instance):
+    """Объект сразу пропадает из API, данные ещё на месте."""
+    if isinstance(instance, Recipe):
+        Recipe._base_manager.filter(pk=instance.pk).update(is_deleted=True)
+        log_recipes([instance.pk], ChangeLogEntry.DELETE)
+    else:
+        User._base_manager.filter(pk=instance.pk).update(is_active=False)
+        Token.objects.filter(user=instance).delete()
+        recipe_ids = list(Recipe.objects.filter(
+            author=instance
+        ).values_list('id', flat=True))
+        Recipe._base_manager.filter(author=instance).update(is_deleted=True)
+        log_recipes(recipe_ids, ChangeLogEntry.DELETE)
+
+
+def schedule_deletion(instance):
+    """
+    Помечает рецепт или пользователя удалённым и удаляет в фоне после
+    фиксации транзакции. При WORKERS=0 удаление выполняется сразу.
+    """
+    model = type(instance)
+    if not settings.DELETION['WORKERS']:
+        return delete_object(model, instance.pk)
+    tombstone(instance)
+    task = partial(_run, model, instance.pk)
+    transaction.on_commit(lambda: get_executor().submit(task))
+
+
+class ScheduledDeletionAdminMixin:
+    """
+    Удаление из админки через schedule_deletion. Страница подтверждения
+    не собирает все связанные объекты, а только перечисляет удаляемые.
+    """
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        return (
+            [str(obj) for obj in objs],
+            {self.model._meta.verbose_name_plural: len(objs)},
+            set(),
+            [],
+        )
+
+    def delete_model(self, request, obj):
+        schedule_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            schedule_deletion(obj)
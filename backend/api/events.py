@@ -0,0 +1,283 @@
+"""
+Живые обновления корзины, избранного и подписок через server-sent
+events. Соединение — корутина ASGI-приложения с небольшой очередью,
+без потока и без объекта запроса Django, поэтому простаивающие
+соединения почти ничего не стоят. События пользователя раздаются
+брокером: в памяти процесса или через Redis между процессами.
+Пропущенное за время разрыва клиент забирает через /api/sync/.
+"""
+import asyncio
+import logging
+import threading
+import time
+from functools import partial
+from urllib.parse import parse_qs
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+from rest_framework.authtoken.models import Token
+
+CHANNEL_PREFIX = 'events:'
+TICKET_SALT = 'api.events.ticket'
+MAX_RECONNECT_DELAY = 30
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Очередь событий одного соединения в его цикле событий."""
+    __slots__ = ('loop', 'queue', 'lost')
+
+    def __init__(self, loop, size):
+        self.loop = loop
+        self.queue = asyncio.Queue(size)
+        self.lost = False
+
+    def push(self, message):
+        # Переполненная очередь не растёт: клиенту уйдёт resync
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.lost = True
+
+
+class LocalBroker:
+    """Подписки и раздача событий внутри одного процесса."""
+    def __init__(self):
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id, subscription):
+        with self.lock:
+            self.subscriptions.setdefault(user_id, set()).add(subscription)
+
+    def unsubscribe(self, user_id, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscriptions[user_id]
+
+    def deliver(self, user_id, message):
+        with self.lock:
+            subscriptions = tuple(self.subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(
+                subscription.push, message
+            )
+
+    def publish(self, user_id, message):
+        self.deliver(user_id, message)
+
+    def deliver_all(self, message):
+        with self.lock:
+            users = list(self.subscriptions)
+        for user_id in users:
+            self.deliver(user_id, message)
+
+
+class RedisBroker(LocalBroker):
+    """
+    События через Redis pub/sub: один поток-слушатель на процесс
+    получает все каналы events:* и раздаёт их локальным подпискам.
+    При обрыве соединения слушатель переподключается с нарастающей
+    паузой, а клиенты получают resync: события за это время потеряны.
+    """
+    def __init__(self):
+        import redis
+        super().__init__()
+        self.client = redis.Redis.from_url(settings.EVENTS['REDIS_URL'])
+        self.listener = None
+
+    def subscribe(self, user_id, subscription):
+        super().subscribe(user_id, subscription)
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(
+                    target=self.listen, name='events-redis', daemon=True
+                )
+                self.listener.start()
+
+    def listen(self):
+        delay = 1
+        reconnect = False
+        while True:
+            started = time.monotonic()
+            try:
+                self.receive(reconnect)
+            except Exception:
+                logger.exception('Events listener failed, reconnecting')
+            if time.monotonic() - started > MAX_RECONNECT_DELAY:
+                delay = 1
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+            reconnect = True
+
+    def receive(self, reconnect):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+            if reconnect:
+                self.deliver_all(format_event('resync', {}))
+            for message in pubsub.listen():
+                channel = message['channel'].decode()
+                self.deliver(
+                    int(channel[len(CHANNEL_PREFIX):]), message['data']
+                )
+        finally:
+            pubsub.close()
+
+    def publish(self, user_id, message):
+        self.client.publish(f'{CHANNEL_PREFIX}{user_id}', message)
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.EVENTS['BROKER'])()
+    return _broker
+
+
+def format_event(event, data):
+    return b'event: %s\ndata: %s\n\n' % (event.encode(), orjson.dumps(data))
+
+
+def publish(user_id, kind, op, object_id):
+    """
+    Событие kind (как в журнале изменений: favorite, shopping_cart,
+    follow) уходит всем соединениям пользователя после фиксации
+    транзакции.
+    """
+    message = format_event(kind, {'op': op, 'id': object_id})
+    transaction.on_commit(
+        partial(get_broker().publish, user_id, message)
+    )
+
+
+def get_user_id(key):
+    close_old_connections()
+    try:
+        return Token.objects.filter(key=key).values_list(
+            'user_id', flat=True
+        ).first()
+    finally:
+        close_old_connections()
+
+
+def make_ticket(user_id):
+    """
+    Короткоживущий подписанный билет для EventSource, который не умеет
+    передавать заголовки. В отличие от токена, билет из журнала
+    доступа через TICKET_MAX_AGE секунд бесполезен.
+    """
+    return signing.dumps(user_id, salt=TICKET_SALT)
+
+
+def read_ticket(ticket):
+    try:
+        return signing.loads(
+            ticket, salt=TICKET_SALT,
+            max_age=settings.EVENTS['TICKET_MAX_AGE']
+        )
+    except signing.BadSignature:
+        return None
+
+
+def get_token(scope):
+    """Токен из заголовка Authorization."""
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            scheme, _, key = value.decode('latin-1').partition(' ')
+            if scheme.lower() == 'token' and key:
+                return key.strip()
+    return None
+
+
+async def authenticate(scope):
+    key = get_token(scope)
+    if key:
+        return await sync_to_async(get_user_id)(key)
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    ticket = query.get('ticket', [None])[0]
+    return read_ticket(ticket) if ticket else None
+
+
+async def respond(send, status, body=b''):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def sse_application(scope, receive, send):
+    """ASGI-приложение /api/events/: поток событий пользователя."""
+    if scope['method'] != 'GET':
+        return await respond(send, 405)
+    user_id = await authenticate(scope)
+    if user_id is None:
+        return await respond(
+            send, 401,
+            orjson.dumps({'detail': 'Учетные данные не были предоставлены.'})
+        )
+
+    config = settings.EVENTS
+    subscription = Subscription(
+        asyncio.get_running_loop(), config['QUEUE_SIZE']
+    )
+    broker = get_broker()
+    broker.subscribe(user_id, subscription)
+
+    async def wait_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        # Закрытие важнее непрочитанных событий
+        while subscription.queue.full():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    disconnect = asyncio.ensure_future(wait_disconnect())
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b'retry: 5000\n\n',
+            'more_body': True,
+        })
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    subscription.queue.get(), config['KEEPALIVE']
+                )
+            except asyncio.TimeoutError:
+                message = b': keepalive\n\n'
+            if message is None:
+                break
+            if subscription.lost:
+                subscription.lost = False
+                message = format_event('resync', {}) + message
+            await send({
+                'type': 'http.response.body',
+                'body': message,
+                'more_body': True,
+            })
+    finally:
+        broker.unsubscribe(user_id, subscription)
+        disconnect.cancel()
@@ -0,0 +1,144 @@
+import binascii
+import os
+import tempfile
+import uuid
+import weakref
+
+from django.conf import settings
+from django.core.files.uploadedfile import (TemporaryUploadedFile,
+                                            UploadedFile)
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import ImageField
+
+# Кратно 4, чтобы каждая порция декодировалась независимо
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = b' \t\r\n'
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class DecodedImageFile(TemporaryUploadedFile):
+    """
+    Временный файл для декодированной картинки. Удаляется при сборке
+    мусора, если хранилище не переместило его в MEDIA.
+    """
+    def __init__(self, name, content_type):
+        file = tempfile.NamedTemporaryFile(
+            suffix='.upload', dir=settings.FILE_UPLOAD_TEMP_DIR, delete=False
+        )
+        UploadedFile.__init__(self, file, name, content_type, 0, None)
+        weakref.finalize(self, remove_file, file.name)
+
+    def close(self):
+        super().close()
+        remove_file(self.temporary_file_path())
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """
+    Base64ImageField, который декодирует строку порциями во временный
+    файл и проверяет формат и размеры картинки по заголовку, как только
+    его удаётся прочитать, — до декодирования остальных данных.
+    Слишком большие и слишком «широкие» картинки отклоняются сразу.
+    """
+    FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+    INVALID_FILE_MESSAGE = 'Загрузите корректное изображение.'
+    INVALID_TYPE_MESSAGE = 'Допустимы только изображения JPEG, PNG и GIF.'
+    TOO_LARGE_MESSAGE = 'Размер файла не должен превышать {size} байт.'
+    TOO_MANY_PIXELS_MESSAGE = (
+        'Изображение не должно быть больше {width}x{height} точек.'
+    )
+
+    def to_internal_value(self, data):
+        if data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(data, str):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        limits = settings.IMAGE_UPLOAD_LIMITS
+
+        content_type = None
+        start = data.find(';base64,')
+        if start == -1:
+            start = 0
+        else:
+            if self.trust_provided_content_type:
+                content_type = data[:start].replace('data:', '')
+            start += len(';base64,')
+        # Оценка сверху по длине строки, до декодирования
+        if (len(data) - start) // 4 * 3 > limits['MAX_SIZE']:
+            raise ValidationError(
+                self.TOO_LARGE_MESSAGE.format(size=limits['MAX_SIZE'])
+            )
+
+        upload = DecodedImageFile(f'{uuid.uuid4()}', content_type)
+        try:
+            extension = self.decode_to_file(data, start, upload, limits)
+            upload.name = f'{upload.name}.{extension}'
+            upload.size = upload.tell()
+            upload.seek(0)
+            # Полная проверка картинки в ImageField идёт по пути к файлу
+            return ImageField.to_internal_value(self, upload)
+        except BaseException:
+            upload.close()
+            raise
+
+    def decode_to_file(self, data, start, upload, limits):
+        extension = None
+        tail = b''
+        for offset in range(start, len(data), CHUNK_SIZE):
+            chunk = tail + data[offset:offset + CHUNK_SIZE].encode(
+                'ascii', 'ignore'
+            ).translate(None, WHITESPACE)
+            usable = len(chunk) // 4 * 4
+            tail = chunk[usable:]
+            try:
+                upload.write(binascii.a2b_base64(chunk[:usable]))
+            except binascii.Error:
+                raise ValidationError(self.INVALID_FILE_MESSAGE)
+            if extension is None:
+                extension = self.check_header(upload, limits, final=False)
+        if tail:
+            try:
+                upload.write(binascii.a2b_base64(tail))
+            except binascii.Error:
+                raise ValidationError(self.INVALID_FILE_MESSAGE)
+        if extension is None:
+            extension = self.check_header(upload, limits, final=True)
+        return extension
+
+    def check_header(self, upload, limits, final):
+        """
+        Формат и размеры по заголовку: Image.open читает только его.
+        Пока заголовок не получен целиком, возвращает None.
+        """
+        position = upload.tell()
+        upload.flush()
+        try:
+            with Image.open(upload.temporary_file_path()) as image:
+                image_format = image.format
+                width, height = image.size
+        except Image.DecompressionBombError:
+            raise ValidationError(self.TOO_MANY_PIXELS_MESSAGE.format(
+                width=limits['MAX_WIDTH'], height=limits['MAX_HEIGHT']
+            ))
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            if final:
+                raise ValidationError(self.INVALID_FILE_MESSAGE)
+            return None
+        finally:
+            upload.seek(position)
+        if image_format not in self.FORMATS:
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        if (width > limits['MAX_WIDTH'] or height > limits['MAX_HEIGHT']
+                or width * height > limits['MAX_PIXELS']):
+            raise ValidationError(self.TOO_MANY_PIXELS_MESSAGE.format(
+                width=limits['MAX_WIDTH'], height=limits['MAX_HEIGHT']
+            ))
+        return self.FORMATS[image_format]
@@ -0,0 +1,100 @@
+"""
+Карта идентичности и память запросов в пределах одного HTTP-запроса.
+Повторная загрузка объекта по первичному ключу или повторный запрос
+с тем же ключом берутся из памяти. Любая запись модели через save()
+или delete() сбрасывает её объекты и запомненные запросы.
+Вне запроса (команды, фоновые потоки) всё идёт напрямую в БД.
+"""
+from asgiref.local import Local
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.generics import get_object_or_404 as load_or_404
+
+_state = Local()
+
+
+class IdentityMap:
+    def __init__(self):
+        self.objects = {}
+        self.memo = {}
+
+    def get(self, model, pk):
+        return self.objects.get((model._meta.label, pk))
+
+    def remember(self, instance):
+        self.objects[(instance._meta.label, instance.pk)] = instance
+        return instance
+
+    def evict(self, model, pk=None):
+        label = model._meta.label
+        if pk is None:
+            self.objects = {
+                key: value for key, value in self.objects.items()
+                if key[0] != label
+            }
+        else:
+            self.objects.pop((label, pk), None)
+        self.memo = {
+            key: value for key, value in self.memo.items()
+            if label not in value[0]
+        }
+
+
+def begin():
+    _state.identity_map = IdentityMap()
+
+
+def end():
+    _state.identity_map = None
+
+
+def current():
+    return getattr(_state, 'identity_map', None)
+
+
+def get_object_or_404(model, pk):
+    """Объект по первичному ключу, не более одного запроса за HTTP-запрос."""
+    identity_map = current()
+    if identity_map is None:
+        return load_or_404(model, pk=pk)
+    try:
+        pk = model._meta.pk.to_python(pk)
+    except Exception:
+        return load_or_404(model, pk=pk)
+    instance = identity_map.get(model, pk)
+    if instance is None:
+        instance = identity_map.remember(load_or_404(model, pk=pk))
+    return instance
+
+
+def remember(instance):
+    identity_map = current()
+    if identity_map is not None:
+        identity_map.remember(instance)
+    return instance
+
+
+def memoize(key, models, loader):
+    """
+    Результат loader() под ключом key до конца запроса или до записи
+    в одну из моделей models.
+    """
+    identity_map = current()
+    if identity_map is None:
+        return loader()
+    if key not in identity_map.memo:
+        labels = frozenset(model._meta.label for model in models)
+        identity_map.memo[key] = (labels, loader())
+    return identity_map.memo[key][1]
+
+
+def evict(model, pk=None):
+    identity_map = current()
+    if identity_map is not None:
+        identity_map.evict(model, pk)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def evict_on_write(sender, instance, **kwargs):
+    evict(sender, instance.pk)
@@ -0,0 +1,144 @@
+import datetime
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from recipes.models import ShoppingListJob
+
+from .shopping_list import get_cart_hash, render_shopping_list
+from .slow_queries import recording
+
+
+def run_job(job_id):
+    """Формирует файл списка покупок для задачи из очереди."""
+    with transaction.atomic():
+        job = (
+            ShoppingListJob.objects
+            .select_for_update(of=('self',))
+            .select_related('user')
+            .filter(pk=job_id, status=ShoppingListJob.PENDING)
+            .first()
+        )
+        if job is None:
+            return
+        job.status = ShoppingListJob.RUNNING
+        job.save(update_fields=('status',))
+    try:
+        job.content = render_shopping_list(job.user, job.format)
+        job.status = ShoppingListJob.DONE
+    except Exception as error:
+        job.error = str(error)
+        job.status = ShoppingListJob.FAILED
+    job.finished = timezone.now()
+    job.save(update_fields=('content', 'status', 'error', 'finished'))
+
+
+class BaseJobBackend(ABC):
+    """
+    Очередь задач списка покупок. Параметры из SHOPPING_LIST_JOBS
+    ['OPTIONS'], которые бэкенду не нужны, игнорируются.
+    """
+    def __init__(self, **options):
+        pass
+
+    @abstractmethod
+    def enqueue(self, job):
+        """Ставит сохранённую задачу в очередь."""
+
+
+class DatabaseBackend(BaseJobBackend):
+    """
+    Задачи только сохраняются в таблицу, их выполняет отдельный процесс
+    manage.py process_shopping_list_jobs.
+    """
+    def enqueue(self, job):
+        pass
+
+
+class LocalPoolBackend(BaseJobBackend):
+    """Выполняет задачи в пуле потоков текущего процесса."""
+    def __init__(self, workers=2, **options):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix='shopping-list'
+        )
+
+    def enqueue(self, job):
+        transaction.on_commit(
+            lambda: self.executor.submit(self._run, job.pk)
+        )
+
+    @staticmethod
+    def _run(job_id):
+        close_old_connections()
+        try:
+            with recording('jobs.run_job'):
+                run_job(job_id)
+        finally:
+            close_old_connections()
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        config = settings.SHOPPING_LIST_JOBS
+        _backend = import_string(config['BACKEND'])(
+            **config.get('OPTIONS', {})
+        )
+    return _backend
+
+
+def prune_jobs(keep_for=None, **filters):
+    """
+    Удаляет задачи старше keep_for секунд (по умолчанию
+    SHOPPING_LIST_JOBS['KEEP_FOR']) вместе с готовыми файлами.
+    Возвращает число удалённых задач.
+    """
+    keep_for = keep_for or settings.SHOPPING_LIST_JOBS['KEEP_FOR']
+    created_before = timezone.now() - datetime.timedelta(seconds=keep_for)
+    return ShoppingListJob.objects.filter(
+        created__lt=created_before, **filters
+    ).delete()[0]
+
+
+def enqueue_shopping_list(user, file_format='txt'):
+    """
+    Возвращает задачу для текущего содержимого корзины.
+    Если файл для такой же корзины уже сформирован или находится в очереди,
+    новая задача не создаётся. Задача, которая не завершилась
+    за STALE_AFTER секунд (например, очередь в памяти потеряна
+    при перезапуске), считается неудавшейся и создаётся заново.
+    Старые задачи пользователя удаляются, остальные — командой
+    prune_shopping_list_jobs.
+    """
+    prune_jobs(user=user)
+    cart_hash = get_cart_hash(user)
+    jobs = ShoppingListJob.objects.filter(
+        user=user, cart_hash=cart_hash, format=file_format
+    )
+    stale_before = timezone.now() - datetime.timedelta(
+        seconds=settings.SHOPPING_LIST_JOBS['STALE_AFTER']
+    )
+    jobs.filter(
+        status__in=(ShoppingListJob.PENDING, ShoppingListJob.RUNNING),
+        created__lt=stale_before
+    ).update(
+        status=ShoppingListJob.FAILED,
+        error='Задача не завершилась вовремя',
+        finished=timezone.now()
+    )
+    job = jobs.exclude(status=ShoppingListJob.FAILED).first()
+    if job is not None:
+        return job
+    job = ShoppingListJob.objects.create(
+        user=user, cart_hash=cart_hash, format=file_format
+    )
+    get_backend().enqueue(job)
+    return job
@@ -0,0 +1,90 @@
+import glob
+from collections import Counter
+
+import numpy as np
+import orjson
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SORT_KEYS = {
+    'total': lambda group: group['total'],
+    'count': lambda group: group['count'],
+    'p95': lambda group: group['p95'],
+}
+
+
+class Command(BaseCommand):
+    """
+    Отчёт по журналу медленных запросов: запросы сгруппированы
+    по отпечатку нормализованного SQL и упорядочены по суммарному
+    времени, числу или p95. Читаются и ротированные файлы.
+    """
+    help = 'rank slow queries from the slow query log by fingerprint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='log files, by default SLOW_QUERIES PATH and its backups'
+        )
+        parser.add_argument(
+            '--sort', choices=sorted(SORT_KEYS), default='total'
+        )
+        parser.add_argument('--limit', default=20, type=int)
+        parser.add_argument('--view', help='only queries from this view')
+
+    def read(self, paths, view):
+        for path in paths:
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+                    if view is None or record.get('view') == view:
+                        yield record
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or sorted(
+            glob.glob(glob.escape(settings.SLOW_QUERIES['PATH']) + '*')
+        )
+        if not paths:
+            raise CommandError('no slow query log files found')
+        durations = {}
+        groups = {}
+        for record in self.read(paths, options['view']):
+            group = groups.get(record['fingerprint'])
+            if group is None:
+                group = groups[record['fingerprint']] = {
+                    'sql': record['sql'],
+                    'views': Counter(),
+                    'origins': Counter(),
+                }
+                durations[record['fingerprint']] = []
+            durations[record['fingerprint']].append(record['ms'])
+            group['views'][record.get('view')] += 1
+            group['origins'][record.get('origin')] += 1
+        for fingerprint, group in groups.items():
+            values = np.array(durations[fingerprint])
+            group.update(
+                count=len(values), total=values.sum(),
+                p95=np.percentile(values, 95), max=values.max()
+            )
+
+        ranked = sorted(
+            groups.items(), key=lambda item: SORT_KEYS[options['sort']](
+                item[1]
+            ), reverse=True
+        )[:options['limit']]
+        print(f'{len(groups)} fingerprints, '
+              f'{sum(group["count"] for group in groups.values())} queries')
+        for rank, (fingerprint, group) in enumerate(ranked, start=1):
+            print(
+                f'\n#{rank} {fingerprint}  total {group["total"]:.0f} ms  '
+                f'count {group["count"]}  p95 {group["p95"]:.1f} ms  '
+                f'max {group["max"]:.1f} ms'
+            )
+            for view, count in group['views'].most_common(3):
+                print(f'    view   {view} ×{count}')
+            for origin, count in group['origins'].most_common(3):
+                print(f'    origin {origin} ×{count}')
+            print(f'    {group["sql"][:300]}')
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+
+class Command(BaseCommand):
+    """
+    Сравнение накладных расходов: новое соединение на каждый запрос
+    против постоянного соединения
+    """
+    help = 'benchmark connection setup overhead'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', default=200, type=int)
+
+    def run_query(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+
+    def measure(self, iterations, reconnect):
+        connection.close()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            if reconnect:
+                connection.close()
+            self.run_query()
+        return (time.perf_counter() - start) / iterations * 1000
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        fresh = self.measure(iterations, reconnect=True)
+        persistent = self.measure(iterations, reconnect=False)
+        connection.close()
+        print(f'{connection.vendor} {connection.settings_dict["HOST"]}')
+        print(f'New connection per query: {fresh:.3f} ms')
+        print(f'Persistent connection:    {persistent:.3f} ms')
+        print(f'Connection setup overhead: {fresh - persistent:.3f} ms')
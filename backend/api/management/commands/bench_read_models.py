@@ -0,0 +1,99 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.read_models import RecipeReadModel, SubscriptionReadModel
+from api.renderers import ORJSONRenderer
+from api.serializers import FollowSerializer, RecipeGetSerializer
+from api.utils import annotate_viewer_flags
+from recipes.models import Follow, Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Сравнение сериализаторов и моделей чтения на странице списка
+    рецептов и подписок: время на страницу и побайтовое совпадение JSON.
+    """
+    help = 'benchmark list read models against DRF serializers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', default=50, type=int)
+        parser.add_argument('--page-size', default=10, type=int)
+        parser.add_argument(
+            '--user', type=int,
+            help='viewer id, defaults to the user with most follows'
+        )
+
+    def get_request(self, path, user):
+        request = Request(APIRequestFactory().get(path))
+        request.user = user
+        return request
+
+    def measure(self, name, iterations, serializer, read_model):
+        renderer = ORJSONRenderer()
+        expected = renderer.render(serializer())
+        actual = renderer.render(read_model())
+        if expected != actual:
+            raise CommandError(
+                f'{name}: read model output differs from the serializer\n'
+                f'{expected[:500]}\n{actual[:500]}'
+            )
+        timings = []
+        for func in (serializer, read_model):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            timings.append(
+                (time.perf_counter() - started) / iterations * 1000
+            )
+        print(f'{name}: serializer {timings[0]:.2f} ms, '
+              f'read model {timings[1]:.2f} ms, '
+              f'x{timings[0] / max(timings[1], 1e-9):.1f}')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        page_size = options['page_size']
+        if options['user']:
+            user = User.objects.get(pk=options['user'])
+        else:
+            user = User.objects.annotate(
+                follows=Count('follower')
+            ).order_by('-follows').first()
+        if user is None:
+            raise CommandError('Нет пользователей')
+
+        request = self.get_request('/api/recipes/', user)
+        context = {'request': request}
+        recipes = annotate_viewer_flags(
+            Recipe.objects.all(), user
+        ).only('id', 'version', 'author_id')
+        recipe_model = RecipeReadModel(context)
+        self.measure(
+            'recipes',
+            iterations,
+            lambda: RecipeGetSerializer(
+                recipes[:page_size], many=True, context=context
+            ).data,
+            lambda: recipe_model.render(recipe_model.rows(
+                recipes.values_list(*recipe_model.row_fields)[:page_size]
+            ))
+        )
+
+        request = self.get_request('/api/users/subscriptions/', user)
+        context = {'request': request}
+        follows = Follow.objects.filter(user=user)
+        subscription_model = SubscriptionReadModel(context)
+        self.measure(
+            'subscriptions',
+            iterations,
+            lambda: FollowSerializer(
+                follows[:page_size], many=True, context=context
+            ).data,
+            lambda: subscription_model.render(list(
+                follows.values_list('following_id', flat=True)[:page_size]
+            ))
+        )
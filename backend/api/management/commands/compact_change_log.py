@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.sync import collapse, expire
+
+
+class Command(BaseCommand):
+    """
+    Сжатие журнала изменений для /api/sync/: удаление записей старше
+    срока хранения и свёртка повторных изменений одного объекта.
+    """
+    help = 'expire and collapse the change log used by /api/sync/'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            default=settings.CHANGE_LOG['RETENTION_DAYS'],
+            type=int,
+            help='keep entries newer than this many days'
+        )
+        parser.add_argument('--batch-size', default=5000, type=int)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        expired = expire(options['days'], options['batch_size'])
+        collapsed = collapse()
+        print(
+            f'{expired} expired, {collapsed} collapsed '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
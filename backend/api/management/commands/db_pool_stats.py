@@ -0,0 +1,37 @@
+import psycopg2
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """
+    Вывод статистики пулов PgBouncer, в том числе времени ожидания клиентов
+    """
+    help = 'show PgBouncer pool and wait time statistics'
+
+    def handle(self, *args, **options):
+        config = settings.PGBOUNCER
+        try:
+            connection = psycopg2.connect(
+                host=config['HOST'],
+                port=config['PORT'],
+                user=config['USER'],
+                password=config['PASSWORD'],
+                dbname='pgbouncer',
+            )
+        except psycopg2.OperationalError as error:
+            raise CommandError(f'PgBouncer недоступен: {error}')
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                for command in ('SHOW POOLS', 'SHOW STATS'):
+                    cursor.execute(command)
+                    columns = [column.name for column in cursor.description]
+                    print(command)
+                    for row in cursor.fetchall():
+                        print('  ' + ', '.join(
+                            f'{name}={value}'
+                            for name, value in zip(columns, row)
+                        ))
+        finally:
+            connection.close()
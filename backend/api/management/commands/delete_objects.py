@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.deletion import delete_object
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Удаление рецептов и пользователей пакетами связей. С --pending
+    доудаляются рецепты, помеченные на удаление, но не удалённые
+    фоновой задачей (например, после перезапуска процесса).
+    """
+    help = 'delete recipes and users with batched cascades'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', nargs='*', type=int, default=[])
+        parser.add_argument('--users', nargs='*', type=int, default=[])
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='finish recipes left with the deletion flag'
+        )
+        parser.add_argument('--batch-size', default=None, type=int)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        targets = [(Recipe, pk) for pk in options['recipes']]
+        if options['pending']:
+            targets += [
+                (Recipe, pk) for pk in Recipe._base_manager.filter(
+                    is_deleted=True
+                ).values_list('pk', flat=True)
+            ]
+        targets += [(User, pk) for pk in options['users']]
+        rows = 0
+        for model, pk in targets:
+            rows += delete_object(model, pk, options['batch_size'])
+        print(
+            f'{len(targets)} objects, {rows} rows '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.jobs import run_job
+from recipes.models import ShoppingListJob
+
+
+class Command(BaseCommand):
+    """
+    Обработчик очереди списков покупок для DatabaseBackend
+    """
+    help = 'process pending shopping list jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            default=1.0,
+            type=float,
+            help='pause between polls in seconds'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='process pending jobs and exit'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            job_ids = list(
+                ShoppingListJob.objects
+                .filter(status=ShoppingListJob.PENDING)
+                .order_by('id')
+                .values_list('id', flat=True)[:100]
+            )
+            for job_id in job_ids:
+                run_job(job_id)
+            if job_ids:
+                print(f'Processed {len(job_ids)} shopping list jobs')
+            if options['once']:
+                break
+            if not job_ids:
+                time.sleep(options['interval'])
@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.jobs import prune_jobs
+
+
+class Command(BaseCommand):
+    """
+    Удаление старых задач списка покупок вместе с готовыми файлами.
+    """
+    help = 'delete old shopping list jobs and their files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seconds',
+            default=settings.SHOPPING_LIST_JOBS['KEEP_FOR'],
+            type=int,
+            help='keep jobs newer than this many seconds'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        deleted = prune_jobs(options['seconds'])
+        print(
+            f'{deleted} jobs deleted '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
@@ -0,0 +1,104 @@
+
+import brotli
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+from . import identity
+from .db import begin_request, end_request
+from .slow_queries import (get_view, record_stream, recording, set_view,
+                           view_name)
+
+re_accepts_brotli = _lazy_re_compile(r'\bbr\b')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Сжимает ответ brotli, если клиент его поддерживает,
+    иначе возвращается к gzip из GZipMiddleware.
+    """
+    brotli_quality = 4
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or len(response.content) < 200
+            or response.has_header('Content-Encoding')
+        ):
+            return super().process_response(request, response)
+
+        ae = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if not re_accepts_brotli.search(ae):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed_content = brotli.compress(
+            response.content, quality=self.brotli_quality
+        )
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Сбрасывает маршрутизацию БД в начале запроса и после записи закрепляет
+    пользователя за primary на DB_REPLICA_STICKY_SECONDS.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        begin_request()
+        try:
+            return self.get_response(request)
+        finally:
+            end_request(request.user)
+
+
+class IdentityMapMiddleware:
+    """
+    Карта идентичности и память запросов живут ровно один запрос.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        identity.begin()
+        try:
+            return self.get_response(request)
+        finally:
+            identity.end()
+
+
+class SlowQueryMiddleware:
+    """
+    Оборачивает запросы всех соединений записью медленных запросов
+    и запоминает имя вьюхи. Включается SLOW_QUERIES_ENABLED.
+    """
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERIES['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with recording():
+            response = self.get_response(request)
+            view = get_view()
+        if response.streaming:
+            response.streaming_content = record_stream(
+                response.streaming_content, view
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        set_view(view_name(request, view_func))
@@ -0,0 +1,67 @@
+from rest_framework import permissions, serializers
+
+from .db import use_replica_for
+
+
+def parse_fields_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    return {field.strip() for field in value.split(',') if field.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Оставляет в ответе только поля из ?fields= и убирает поля из ?omit=.
+    Вложенные поля задаются через точку: ?omit=author.is_subscribed.
+    Отброшенные поля не привязываются к сериализатору, поэтому их
+    SerializerMethodField не вычисляются вовсе.
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return fields
+
+        prefix = self._get_field_path()
+        only = parse_fields_param(request, 'fields')
+        omit = parse_fields_param(request, 'omit')
+
+        if only is not None:
+            nested = {
+                field[len(prefix):] for field in only
+                if field.startswith(prefix)
+            }
+            if prefix == '' or nested:
+                fields = {
+                    name: field for name, field in fields.items()
+                    if name in nested
+                    or any(item.startswith(f'{name}.') for item in nested)
+                }
+        if omit is not None:
+            for field in omit:
+                if field.startswith(prefix):
+                    fields.pop(field[len(prefix):], None)
+        return fields
+
+    def _get_field_path(self):
+        names = []
+        node = self
+        while node is not None:
+            if node.field_name and not isinstance(
+                    node, serializers.ListSerializer
+            ):
+                names.append(node.field_name)
+            node = node.parent
+        return ''.join(f'{name}.' for name in reversed(names))
+
+
+class ReplicaReadMixin:
+    """
+    Безопасные запросы вьюсета читают с реплики БД,
+    если пользователь недавно ничего не записывал.
+    """
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in permissions.SAFE_METHODS:
+            use_replica_for(request.user)
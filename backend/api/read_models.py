@@ -0,0 +1,184 @@
+"""
+Модели чтения для списков: строки берутся через values_list, хранятся
+в лёгких объектах со __slots__ и выводятся заранее собранными
+функциями полей без машинерии ModelSerializer. Набор и порядок полей
+берутся из соответствующих сериализаторов, поэтому JSON совпадает
+с их выводом, включая ?fields= и ?omit=.
+"""
+from recipes.models import Recipe
+from users.cache import get_following, get_profiles
+from .cache import get_recipe_fragments, get_tags
+from .serializers import (FollowSerializer, RecipeFollowSerializer,
+                          RecipeGetSerializer, build_recipe_fragments)
+from .utils import image_url
+
+
+class RecipeRow:
+    """Строка списка рецептов: то, что зависит от пользователя запроса."""
+    __slots__ = (
+        'id', 'version', 'author_id', 'is_favorited', 'is_in_shopping_cart'
+    )
+
+    def __init__(self, id, version, author_id, is_favorited,
+                 is_in_shopping_cart):
+        self.id = id
+        self.version = version
+        self.author_id = author_id
+        self.is_favorited = is_favorited
+        self.is_in_shopping_cart = is_in_shopping_cart
+
+    @property
+    def pk(self):
+        return self.id
+
+
+class RecipeShortRow:
+    __slots__ = ('author_id', 'id', 'name', 'image', 'cooking_time')
+
+    def __init__(self, author_id, id, name, image, cooking_time):
+        self.author_id = author_id
+        self.id = id
+        self.name = name
+        self.image = image
+        self.cooking_time = cooking_time
+
+
+def readable_fields(serializer):
+    return [
+        name for name, field in serializer.fields.items()
+        if not field.write_only
+    ]
+
+
+def author_emitter(field_names, request, author_ids):
+    """Функция вывода автора по id, как CustomUserSerializer."""
+    profiles = get_profiles(author_ids)
+    following = (
+        get_following(request) if 'is_subscribed' in field_names else ()
+    )
+
+    def emit(author_id):
+        profile = profiles.get(author_id)
+        if profile is None:
+            return None
+        return {
+            name: (author_id in following if name == 'is_subscribed'
+                   else profile[name])
+            for name in field_names
+        }
+    return emit
+
+
+class RecipeReadModel:
+    """Список рецептов в формате RecipeGetSerializer."""
+    row_fields = RecipeRow.__slots__
+
+    def __init__(self, context):
+        self.context = context
+        serializer = RecipeGetSerializer(context=context)
+        self.fields = list(serializer.fields)
+        self.author_fields = (
+            readable_fields(serializer.fields['author'])
+            if 'author' in serializer.fields else None
+        )
+
+    def rows(self, values):
+        return [RecipeRow(*row) for row in values]
+
+    def render(self, rows):
+        fragments = get_recipe_fragments(
+            rows,
+            lambda missing: build_recipe_fragments(missing, self.context)
+        )
+        emitters = []
+        for name in self.fields:
+            if name == 'author':
+                author = author_emitter(
+                    self.author_fields, self.context.get('request'),
+                    {row.author_id for row in rows}
+                )
+                emitters.append(
+                    (name, lambda row, fragment: author(row.author_id))
+                )
+            elif name == 'tags':
+                tags = get_tags()
+                emitters.append((name, lambda row, fragment: [
+                    tags[tag_id] for tag_id in fragment['tag_ids']
+                    if tag_id in tags
+                ]))
+            elif name == 'image':
+                request = self.context.get('request')
+                emitters.append((name, lambda row, fragment: image_url(
+                    fragment['image'], request
+                )))
+            elif name == 'is_favorited':
+                emitters.append(
+                    (name, lambda row, fragment: row.is_favorited)
+                )
+            elif name == 'is_in_shopping_cart':
+                emitters.append(
+                    (name, lambda row, fragment: row.is_in_shopping_cart)
+                )
+            else:
+                emitters.append(
+                    (name, lambda row, fragment, name=name: fragment[name])
+                )
+        return [
+            {name: emit(row, fragments[row.id]) for name, emit in emitters}
+            for row in rows
+        ]
+
+
+class SubscriptionReadModel:
+    """Список подписок в формате FollowSerializer по id авторов."""
+    def __init__(self, context):
+        self.context = context
+        self.fields = readable_fields(FollowSerializer(context=context))
+        self.recipe_fields = readable_fields(RecipeFollowSerializer())
+
+    def render(self, author_ids):
+        profiles = get_profiles(author_ids)
+        # автор мог быть удалён после выборки подписок
+        author_ids = [
+            author_id for author_id in author_ids if author_id in profiles
+        ]
+        recipes = {}
+        if 'recipes' in self.fields or 'recipes_count' in self.fields:
+            for row in Recipe.objects.filter(
+                    author_id__in=author_ids
+            ).order_by('-id').values_list(*RecipeShortRow.__slots__):
+                recipe = RecipeShortRow(*row)
+                recipes.setdefault(recipe.author_id, []).append(recipe)
+
+        def emit_recipe(recipe):
+            # RecipeFollowSerializer внутри FollowSerializer создаётся
+            # без контекста, поэтому URL картинки относительный
+            return {
+                name: (image_url(recipe.image, None) if name == 'image'
+                       else getattr(recipe, name))
+                for name in self.recipe_fields
+            }
+
+        emitters = []
+        for name in self.fields:
+            if name == 'is_subscribed':
+                # В списке своих подписок всегда True
+                emitters.append((name, lambda author_id: True))
+            elif name == 'recipes':
+                emitters.append((name, lambda author_id: [
+                    emit_recipe(recipe)
+                    for recipe in recipes.get(author_id, ())
+                ]))
+            elif name == 'recipes_count':
+                emitters.append(
+                    (name, lambda author_id: len(recipes.get(author_id, ())))
+                )
+            else:
+                emitters.append((
+                    name,
+                    lambda author_id, name=name: profiles[author_id][name]
+                ))
+        return [
+            {name: emit(author_id) for name, emit in emitters}
+            for author_id in author_ids
+        ]
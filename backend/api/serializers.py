@@ -1,10 +1,18 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.core.files.utils import validate_file_name
 from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers, status
 
 from users.serializers import CustomUserSerializer
+from .cache import get_recipe_fragments, get_tags
+from .fields import StreamingBase64ImageField
+from .mixins import SparseFieldsMixin
+from .utils import annotate_recipes, image_url, with_recipe_details
 from recipes.models import (FavouriteRecipes, Follow, Ingredient, Recipe,
-                            IngredientsInRecipe, ShoppingCart, Tag)
+                            IngredientsInRecipe, ShoppingCart, SimilarRecipe,
+                            Tag)
+from recipes.similarity import schedule_update
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -58,8 +66,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         many=True,
         source='ingredients_in_recipe'
     )
-    image = Base64ImageField()
-    author = CustomUserSerializer(read_only=True)
+    image = StreamingBase64ImageField()
+    author = CustomUserSerializer(read_only=True, source='author_id')
     cooking_time = serializers.IntegerField()
 
     class Meta:
@@ -110,16 +118,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
 
     def to_representation(self, instance):
-        self.fields.pop('ingredients')
-        self.fields.pop('tags')
-        representation = super().to_representation(instance)
-        representation['ingredients'] = IngredientRecipeGetSerializer(
-            IngredientsInRecipe.objects.filter(recipe=instance), many=True
-        ).data
-        representation['tags'] = TagSerializer(
-            instance.tags, many=True
-        ).data
-        return representation
+        recipe = annotate_recipes(
+            Recipe.objects.filter(pk=instance.pk),
+            self.context['request'].user
+        ).get()
+        return RecipeGetSerializer(recipe, context=self.context).data
 
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients_in_recipe')
@@ -135,6 +138,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             for ingredient_data in ingredients_data
         ]
         IngredientsInRecipe.objects.bulk_create(bulk_create_data)
+        schedule_update([recipe.pk])
         return recipe
 
     def update(self, instance, validated_data):
@@ -155,19 +159,154 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                     for ingredient_data in ingredients_data
                 )
                 IngredientsInRecipe.objects.bulk_create(bulk_create_data)
+            schedule_update([instance.pk])
         return super().update(instance, validated_data)
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
+class IngredientImportSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100)
+    measurement_unit = serializers.CharField(max_length=200)
+    amount = serializers.IntegerField(min_value=1)
+
+
+class RecipeImportSerializer(serializers.Serializer):
+    """
+    Строка NDJSON-импорта. Проверяется без запросов к БД: теги,
+    ингредиенты и автор разрешаются сразу для всей порции.
+    """
+    author = serializers.EmailField(required=False)
+    name = serializers.CharField(max_length=50)
+    text = serializers.CharField(max_length=500)
+    cooking_time = serializers.IntegerField(min_value=1)
+    image = serializers.CharField(required=False, allow_blank=True)
+    tags = serializers.ListField(
+        child=serializers.SlugField(max_length=200), allow_empty=False
+    )
+    ingredients = IngredientImportSerializer(many=True, allow_empty=False)
+
+    def validate_image(self, value):
+        # data URI сохраняется как новый файл, иначе это имя уже
+        # существующего файла в MEDIA, как в выгрузке без картинок
+        if not value:
+            return value
+        if value.startswith('data:'):
+            return StreamingBase64ImageField().to_internal_value(value)
+        try:
+            validate_file_name(value, allow_relative_path=True)
+            exists = default_storage.exists(value)
+        except SuspiciousFileOperation:
+            exists = False
+        if not exists:
+            raise serializers.ValidationError(
+                'Картинка должна быть data URI или именем файла в MEDIA.'
+            )
+        return value
+
+    def validate_ingredients(self, value):
+        keys = [(item['name'], item['measurement_unit']) for item in value]
+        if len(keys) != len(set(keys)):
+            raise serializers.ValidationError(
+                'какой-то ингредиент выбран больше одного раза'
+            )
+        return value
+
+
+class RecipeFragmentSerializer(serializers.ModelSerializer):
+    """
+    Часть рецепта, не зависящая от пользователя; хранится в кэше.
+    Картинка хранится именем файла: абсолютный URL зависит от хоста
+    запроса и собирается при выводе.
+    """
+    author_id = serializers.ReadOnlyField()
+    tag_ids = serializers.SerializerMethodField()
+    ingredients = serializers.SerializerMethodField()
+    image = serializers.ReadOnlyField(source='image.name')
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id',
+            'author_id',
+            'tag_ids',
+            'ingredients',
+            'name',
+            'image',
+            'text',
+            'cooking_time',
+        )
+
+    def get_tag_ids(self, obj):
+        if not hasattr(obj, 'tag_ids'):
+            return sorted(obj.tags.values_list('id', flat=True))
+        if not obj.tag_ids:
+            return []
+        return sorted(int(pk) for pk in obj.tag_ids.split(','))
+
+    def get_ingredients(self, obj):
+        if 'ingredients_in_recipe' in getattr(
+                obj, '_prefetched_objects_cache', {}
+        ):
+            recipe_ingredients = obj.ingredients_in_recipe.all()
+        else:
+            recipe_ingredients = IngredientsInRecipe.objects.filter(
+                recipe=obj
+            ).select_related('ingredient')
+        return IngredientRecipeGetSerializer(
+            recipe_ingredients, many=True
+        ).data
+
+
+def build_recipe_fragments(recipes, context):
+    """
+    Фрагменты для рецептов, которых нет в кэше. Рецепты, загруженные
+    через with_recipe_details, используются как есть, остальные
+    догружаются одним запросом.
+    """
+    loaded = [
+        recipe for recipe in recipes
+        if hasattr(recipe, 'tag_ids')
+        and 'ingredients_in_recipe' in getattr(
+            recipe, '_prefetched_objects_cache', {}
+        )
+    ]
+    rest = [recipe.pk for recipe in recipes if recipe not in loaded]
+    if rest:
+        loaded += with_recipe_details(Recipe.objects.filter(pk__in=rest))
+    return [
+        (recipe, dict(RecipeFragmentSerializer(recipe, context=context).data))
+        for recipe in loaded
+    ]
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        fragments = get_recipe_fragments(
+            recipes,
+            lambda missing: build_recipe_fragments(missing, self.context)
+        )
+        return [
+            self.child.compose(recipe, fragments[recipe.pk])
+            for recipe in recipes
+        ]
+
+
+class RecipeGetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Собирает ответ из кэшированного фрагмента рецепта и полей,
+    зависящих от пользователя: is_favorited, is_in_shopping_cart
+    и author.is_subscribed.
+    """
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField()
-    ingredients = serializers.SerializerMethodField()
-    tags = TagSerializer(many=True, read_only=True)
+    author = CustomUserSerializer(read_only=True, source='author_id')
+    image = StreamingBase64ImageField()
+    ingredients = serializers.ReadOnlyField()
+    tags = serializers.ReadOnlyField()
 
     class Meta:
         model = Recipe
+        list_serializer_class = RecipeListSerializer
         fields = (
             'id',
             'tags',
@@ -182,6 +321,8 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request_user = self.context['request'].user
         if request_user.is_anonymous:
             return False
@@ -190,6 +331,8 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         ).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request_user = self.context['request'].user
         if request_user.is_anonymous:
             return False
@@ -197,22 +340,59 @@ class RecipeGetSerializer(serializers.ModelSerializer):
             recipe=obj, user=request_user
         ).exists()
 
-    def get_ingredients(self, obj):
-        recipe_ingredients = IngredientsInRecipe.objects.filter(recipe=obj)
-        return IngredientRecipeGetSerializer(
-            recipe_ingredients, many=True
-        ).data
+    def compose(self, instance, fragment):
+        representation = {}
+        for name, field in self.fields.items():
+            if name == 'author':
+                representation[name] = field.to_representation(
+                    fragment['author_id']
+                )
+            elif name == 'tags':
+                tags = get_tags()
+                representation[name] = [
+                    tags[tag_id] for tag_id in fragment['tag_ids']
+                    if tag_id in tags
+                ]
+            elif name == 'image':
+                representation[name] = image_url(
+                    fragment['image'], self.context.get('request')
+                )
+            elif name == 'is_favorited':
+                representation[name] = self.get_is_favorited(instance)
+            elif name == 'is_in_shopping_cart':
+                representation[name] = self.get_is_in_shopping_cart(instance)
+            else:
+                representation[name] = fragment[name]
+        return representation
+
+    def to_representation(self, instance):
+        fragments = get_recipe_fragments(
+            [instance],
+            lambda missing: build_recipe_fragments(missing, self.context)
+        )
+        return self.compose(instance, fragments[instance.pk])
 
 
 class RecipeFollowSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class SimilarRecipeSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='similar.id')
+    name = serializers.ReadOnlyField(source='similar.name')
+    image = StreamingBase64ImageField(source='similar.image', read_only=True)
+    cooking_time = serializers.ReadOnlyField(source='similar.cooking_time')
+
+    class Meta:
+        model = SimilarRecipe
+        fields = ('id', 'name', 'image', 'cooking_time', 'score')
+
+
+class FollowSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='following.id')
     email = serializers.ReadOnlyField(source='following.email')
     username = serializers.ReadOnlyField(source='following.username')
@@ -0,0 +1,142 @@
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.http import HttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.models import IngredientsInRecipe, Recipe
+
+CONTENT_TYPES = {
+    'txt': 'text/plain',
+    'pdf': 'application/pdf',
+}
+
+PDF_FONT = 'ShoppingListFont'
+
+PDFLayout = namedtuple(
+    'PDFLayout',
+    ('page_size', 'left', 'top', 'bottom', 'text_width',
+     'font_size', 'title_size', 'leading')
+)
+
+
+def get_cart_ingredients(user):
+    """Суммарное количество каждого ингредиента из корзины пользователя."""
+    return (
+        IngredientsInRecipe.objects
+        .filter(recipe__cart__user=user, recipe__is_deleted=False)
+        .values('ingredient')
+        .annotate(total_amount=Sum('amount'))
+        .values_list(
+            'ingredient__name',
+            'total_amount',
+            'ingredient__measurement_unit'
+        )
+    )
+
+
+def get_cart_hash(user):
+    """
+    Отпечаток содержимого корзины одним агрегирующим запросом.
+    Версия рецепта растёт при любой правке рецепта, его ингредиентов
+    и самих ингредиентов (переименование, слияние дубликатов);
+    max(id) и число строк ловят изменения мимо версии.
+    """
+    rows = (
+        Recipe.objects
+        .filter(cart__user=user)
+        .annotate(
+            last_ingredient=Max('ingredients_in_recipe__id'),
+            ingredients_count=Count('ingredients_in_recipe'),
+        )
+        .order_by('id')
+        .values_list(
+            'id', 'version', 'last_ingredient', 'ingredients_count'
+        )
+    )
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update('{}:{}:{}:{};'.format(*row).encode())
+    return digest.hexdigest()
+
+
+def render_txt(ingredients):
+    text = ''
+    for ingredient in ingredients:
+        text += '{} - {} {}. \n'.format(*ingredient)
+    return f'Покупки:\n {text}'.encode()
+
+
+@lru_cache(maxsize=None)
+def get_pdf_layout():
+    """
+    Шрифт с кириллицей и геометрия страницы загружаются один раз
+    на процесс и переиспользуются всеми запросами.
+    """
+    pdfmetrics.registerFont(TTFont(PDF_FONT, settings.SHOPPING_LIST_PDF_FONT))
+    width, height = A4
+    margin = 20 * mm
+    return PDFLayout(
+        page_size=A4,
+        left=margin,
+        top=height - margin,
+        bottom=margin,
+        text_width=width - 2 * margin,
+        font_size=12,
+        title_size=18,
+        leading=16,
+    )
+
+
+def render_pdf(ingredients):
+    layout = get_pdf_layout()
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=layout.page_size)
+    pdf.setTitle('Список покупок')
+
+    text = pdf.beginText(layout.left, layout.top)
+    text.setFont(PDF_FONT, layout.title_size, layout.title_size * 1.5)
+    text.textLine('Список покупок')
+    text.setFont(PDF_FONT, layout.font_size, layout.leading)
+    for ingredient in ingredients:
+        line = '• {} - {} {}'.format(*ingredient)
+        for part in simpleSplit(
+                line, PDF_FONT, layout.font_size, layout.text_width
+        ):
+            if text.getY() < layout.bottom:
+                pdf.drawText(text)
+                pdf.showPage()
+                text = pdf.beginText(layout.left, layout.top)
+                text.setFont(PDF_FONT, layout.font_size, layout.leading)
+            text.textLine(part)
+    pdf.drawText(text)
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    'txt': render_txt,
+    'pdf': render_pdf,
+}
+
+
+def render_shopping_list(user, file_format='txt'):
+    return RENDERERS[file_format](get_cart_ingredients(user))
+
+
+def shopping_list_response(content, file_format='txt'):
+    file = HttpResponse(content, content_type=CONTENT_TYPES[file_format])
+    file['Content-Disposition'] = (
+        f'attachment; filename=cart.{file_format}'
+    )
+    return file
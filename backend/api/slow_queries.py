@@ -0,0 +1,168 @@
+"""
+Запись медленных запросов к БД. Обёртка connection.execute_wrapper
+замеряет каждый запрос; запросы дольше порога (с вероятностью
+SAMPLE_RATE) пишутся строкой JSON в ротируемый файл: нормализованный
+SQL и его отпечаток, вьюха и место вызова в коде проекта.
+Запросы записываются во время обработки запроса, при отдаче
+потокового ответа и в фоновых задачах, обёрнутых recording().
+Разбор файла — команда analyze_slow_queries.
+"""
+import hashlib
+import logging
+import os
+import random
+import re
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+from logging.handlers import RotatingFileHandler
+
+import asgiref
+import django
+import orjson
+from asgiref.local import Local
+from django.conf import settings
+from django.db import connections
+
+_state = Local()
+
+SKIPPED_PATHS = (
+    os.path.dirname(django.__file__),
+    os.path.dirname(asgiref.__file__),
+    os.path.join(os.path.dirname(__file__), 'middleware.py'),
+    __file__,
+)
+
+string_literal = re.compile(r"'(?:[^']|'')*'")
+number_literal = re.compile(r'\b\d+(?:\.\d+)?\b')
+placeholder_list = re.compile(r'\(\s*(?:\?\s*,\s*)+\?\s*\)')
+whitespace = re.compile(r'\s+')
+
+_logger = None
+
+
+def get_logger():
+    global _logger
+    if _logger is None:
+        config = settings.SLOW_QUERIES
+        os.makedirs(os.path.dirname(config['PATH']), exist_ok=True)
+        handler = RotatingFileHandler(
+            config['PATH'],
+            maxBytes=config['MAX_BYTES'],
+            backupCount=config['BACKUP_COUNT'],
+            encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger = logging.getLogger('api.slow_queries')
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+    return _logger
+
+
+def normalize(sql):
+    """SQL без значений: литералы и параметры — ?, списки IN — (...)."""
+    sql = string_literal.sub('?', sql.replace('%s', '?'))
+    sql = number_literal.sub('?', sql)
+    sql = placeholder_list.sub('(...)', sql)
+    return whitespace.sub(' ', sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def get_origin():
+    """
+    Ближайший к запросу кадр стека вне Django, asgiref и middleware
+    проекта: код проекта или, например, миксин DRF.
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if not path.startswith(SKIPPED_PATHS):
+            return (
+                f'{short_path(path)}:{frame.f_lineno} {frame.f_code.co_name}'
+            )
+        frame = frame.f_back
+    return None
+
+
+def short_path(path):
+    root = str(settings.BASE_DIR)
+    if path.startswith(root):
+        return os.path.relpath(path, root)
+    return path.rpartition('site-packages' + os.sep)[2]
+
+
+def view_name(request, view_func):
+    """
+    Имя вьюхи для отчёта: RecipesViewSet.list, RecipesViewSet.
+    download_shopping_cart; для прочих — __qualname__ функции.
+    """
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__qualname__', repr(view_func))
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+def set_view(name):
+    _state.view = name
+
+
+def get_view():
+    return getattr(_state, 'view', None)
+
+
+@contextmanager
+def recording(view=None):
+    """
+    Запись медленных запросов всех соединений текущего потока; view —
+    имя вьюхи или фоновой задачи в отчёте. Без ENABLED ничего не делает.
+    """
+    if not settings.SLOW_QUERIES['ENABLED']:
+        yield
+        return
+    previous = get_view()
+    set_view(view)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(record_slow_queries)
+                )
+            yield
+    finally:
+        set_view(previous)
+
+
+def record_stream(content, view):
+    """Потоковый ответ читает БД уже после выхода из middleware."""
+    with recording(view):
+        yield from content
+
+
+def record_slow_queries(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = (time.perf_counter() - started) * 1000
+        config = settings.SLOW_QUERIES
+        if (
+            duration >= config['THRESHOLD_MS']
+            and random.random() < config['SAMPLE_RATE']
+        ):
+            normalized = normalize(sql)
+            get_logger().info(orjson.dumps({
+                'ts': time.time(),
+                'ms': round(duration, 3),
+                'db': context['connection'].alias,
+                'fingerprint': fingerprint(normalized),
+                'sql': normalized,
+                'many': many,
+                'view': get_view(),
+                'origin': get_origin(),
+            }).decode())
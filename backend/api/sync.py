@@ -0,0 +1,209 @@
+"""
+Журнал изменений для дельта-синхронизации клиентов. Сигналы рецептов,
+избранного, списка покупок и подписок пишут в ChangeLogEntry, а
+/api/sync/?since=<курсор> отдаёт только изменения после курсора.
+"""
+import datetime
+from functools import reduce
+from operator import or_
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.models import (ChangeLogEntry, ChangeLogHorizon,
+                            FavouriteRecipes, Follow, Recipe, ShoppingCart)
+
+SEQUENCE_LOCK = 4601
+
+USER_KINDS = {
+    FavouriteRecipes: (ChangeLogEntry.FAVORITE, 'recipe_id'),
+    ShoppingCart: (ChangeLogEntry.SHOPPING_CART, 'recipe_id'),
+    Follow: (ChangeLogEntry.FOLLOW, 'following_id'),
+}
+
+
+class CursorExpired(Exception):
+    """Курсор старше границы сжатия журнала."""
+
+
+def log_recipes(recipe_ids, op=ChangeLogEntry.UPDATE):
+    """Изменения рецептов мимо save(), например queryset.update()."""
+    ChangeLogEntry.objects.bulk_create(
+        ChangeLogEntry(kind=ChangeLogEntry.RECIPE, object_id=recipe_id, op=op)
+        for recipe_id in recipe_ids
+    )
+
+
+def get_horizon():
+    return ChangeLogHorizon.objects.values_list(
+        'horizon', flat=True
+    ).first() or 0
+
+
+def sequence():
+    """
+    Нумерует зафиксированные записи без номера в порядке id. Номера
+    выдаются под блокировкой по одной транзакции за раз, поэтому все
+    номера меньше видимого уже зафиксированы. Запись из долгой
+    транзакции получает номер после её фиксации — больше любого
+    курсора, который клиенты уже получили, и не будет ими пропущена.
+    """
+    horizon = get_horizon()
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_advisory_xact_lock(%s)', [SEQUENCE_LOCK]
+                )
+        # Один UPDATE: границы и записи берутся из одного снимка
+        pending = ChangeLogEntry.objects.filter(seq__isnull=True)
+        low = pending.order_by('id').values('id')[:1]
+        last = ChangeLogEntry.objects.filter(
+            seq__isnull=False
+        ).order_by('-seq').values('seq')[:1]
+        pending.update(seq=F('id') - Subquery(low) + Greatest(
+            Coalesce(Subquery(last), 0), Value(horizon)
+        ) + 1)
+
+
+def visible_to(queryset, user):
+    if user.is_anonymous:
+        return queryset.filter(user__isnull=True)
+    return queryset.filter(Q(user=user) | Q(user__isnull=True))
+
+
+def get_cursor():
+    """Курсор для клиента, который только что скачал всё целиком."""
+    sequence()
+    cursor = ChangeLogEntry.objects.aggregate(cursor=Max('seq'))['cursor']
+    return max(cursor or 0, get_horizon())
+
+
+def get_changes(user, since, limit):
+    """
+    Изменения после курсора since, свёрнутые по объектам: для каждого
+    (вид, id) остаётся итог — upsert или delete. Удаление отдаётся,
+    даже если объект создан после курсора: клиент мог получить его
+    полной выгрузкой, а незнакомые id клиент просто пропускает.
+    Возвращает (курсор, есть ли ещё, {вид: {'upsert': ids, 'delete': ids}}).
+    """
+    if since < get_horizon():
+        raise CursorExpired
+    sequence()
+    rows = list(
+        visible_to(ChangeLogEntry.objects, user).filter(seq__gt=since)
+        .order_by('seq').values_list('seq', 'kind', 'object_id', 'op')
+        [:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last_ops = {}
+    for _, kind, object_id, op in rows:
+        last_ops[(kind, object_id)] = op
+    changes = {
+        kind: {'upsert': [], 'delete': []}
+        for kind, _ in ChangeLogEntry.KIND_CHOICES
+    }
+    for (kind, object_id), op in last_ops.items():
+        if op == ChangeLogEntry.DELETE:
+            changes[kind]['delete'].append(object_id)
+        else:
+            changes[kind]['upsert'].append(object_id)
+    return (rows[-1][0] if rows else since), has_more, changes
+
+
+def expire(days, batch_size=5000):
+    """
+    Удаляет записи старше days дней и сдвигает границу журнала.
+    Возвращает число удалённых записей.
+    """
+    horizon = ChangeLogEntry.objects.filter(
+        created__lt=timezone.now() - datetime.timedelta(days=days),
+        seq__isnull=False
+    ).aggregate(horizon=Max('seq'))['horizon']
+    if horizon is None:
+        return 0
+    # Граница сдвигается раньше удаления, чтобы ни один клиент
+    # не получил курсор внутри частично удалённого диапазона
+    ChangeLogHorizon.objects.create(horizon=horizon)
+    deleted = 0
+    while True:
+        ids = list(ChangeLogEntry.objects.filter(
+            seq__lte=horizon
+        ).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += ChangeLogEntry.objects.filter(id__in=ids).delete()[0]
+    ChangeLogHorizon.objects.filter(horizon__lt=horizon).delete()
+    return deleted
+
+
+def collapse(batch_size=500):
+    """
+    Оставляет по одной, последней, записи на объект. Клиент с любым
+    курсором всё равно получит итоговое состояние объекта.
+    Возвращает число удалённых записей.
+    """
+    sequence()
+    groups = ChangeLogEntry.objects.filter(seq__isnull=False).values(
+        'user', 'kind', 'object_id'
+    ).annotate(last=Max('seq'), count=Count('id')).filter(
+        count__gt=1
+    ).values_list('user', 'kind', 'object_id', 'last').iterator()
+    deleted = 0
+    while True:
+        batch = [group for _, group in zip(range(batch_size), groups)]
+        if not batch:
+            return deleted
+        with transaction.atomic():
+            deleted += ChangeLogEntry.objects.filter(reduce(or_, (
+                Q(user=user, kind=kind, object_id=object_id, seq__lt=last)
+                for user, kind, object_id, last in batch
+            ))).delete()[0]
+
+
+@receiver(post_save, sender=Recipe)
+def log_recipe_save(sender, instance, created, **kwargs):
+    ChangeLogEntry.objects.create(
+        kind=ChangeLogEntry.RECIPE,
+        object_id=instance.pk,
+        op=ChangeLogEntry.CREATE if created else ChangeLogEntry.UPDATE
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def log_recipe_delete(sender, instance, **kwargs):
+    ChangeLogEntry.objects.create(
+        kind=ChangeLogEntry.RECIPE,
+        object_id=instance.pk,
+        op=ChangeLogEntry.DELETE
+    )
+
+
+def log_relation(sender, instance, op):
+    kind, field = USER_KINDS[sender]
+    ChangeLogEntry.objects.create(
+        user_id=instance.user_id,
+        kind=kind,
+        object_id=getattr(instance, field),
+        op=op
+    )
+
+
+@receiver(post_save, sender=FavouriteRecipes)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+def log_relation_save(sender, instance, created, **kwargs):
+    if created:
+        log_relation(sender, instance, ChangeLogEntry.CREATE)
+
+
+@receiver(post_delete, sender=FavouriteRecipes)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+def log_relation_delete(sender, instance, **kwargs):
+    log_relation(sender, instance, ChangeLogEntry.DELETE)
@@ -0,0 +1,210 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from recipes.models import (ChangeLogEntry, FavouriteRecipes, Follow,
+                            Ingredient, IngredientsInRecipe, Recipe,
+                            ShoppingCart, Tag)
+from users.cache import local_profiles
+from users.models import User
+
+from .read_models import RecipeReadModel, SubscriptionReadModel
+from .renderers import ORJSONRenderer
+from .serializers import FollowSerializer, RecipeGetSerializer
+from .sync import get_changes, get_cursor
+from .utils import annotate_viewer_flags
+
+
+class RecipeTestData:
+    """Автор с рецептами, теги, ингредиенты и читатель с подпиской."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pw'
+        )
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pw'
+        )
+        tags = [
+            Tag.objects.create(name=f'Тег {i}', slug=f'tag-{i}')
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(5)
+        ]
+        for i in range(12):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {i}', text='text',
+                cooking_time=10, image=f'recipes/images/{i}.png'
+            )
+            recipe.tags.set(tags)
+            IngredientsInRecipe.objects.bulk_create(
+                IngredientsInRecipe(recipe=recipe, ingredient=ingredient,
+                                    amount=i + 1)
+                for ingredient in ingredients
+            )
+        cls.recipe = recipe
+        FavouriteRecipes.objects.create(user=cls.reader, recipe=recipe)
+        ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+        Follow.objects.create(user=cls.reader, following=cls.author)
+        cls.tokens = {
+            user: Token.objects.create(user=user).key
+            for user in (cls.author, cls.reader)
+        }
+
+
+class RecipeQueryCountTest(RecipeTestData, APITestCase):
+    """Чтение рецептов не зависит от числа ингредиентов, тегов и рецептов."""
+
+    def setUp(self):
+        cache.clear()
+        local_profiles.clear()
+
+    def get(self, url, user=None):
+        client = self.client_class()
+        if user is not None:
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {self.tokens[user]}'
+            )
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def warm_up(self, url, user=None):
+        # Фрагменты рецептов, теги, профили и подписки попадают в кэш
+        self.get(url, user)
+
+    def test_retrieve_cold_cache(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        # Токен, рецепт с флагами, фрагмент (рецепт с тегами
+        # и ингредиенты), теги, профиль автора и подписки читателя
+        with self.assertNumQueries(7):
+            self.get(url, self.reader)
+
+    def test_retrieve_as_author(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.warm_up(url, self.author)
+        with self.assertNumQueries(2):
+            self.get(url, self.author)
+
+    def test_retrieve_as_reader(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.warm_up(url, self.reader)
+        with self.assertNumQueries(2):
+            response = self.get(url, self.reader)
+        self.assertTrue(response.data['is_favorited'])
+        self.assertTrue(response.data['is_in_shopping_cart'])
+        self.assertTrue(response.data['author']['is_subscribed'])
+        self.assertEqual(len(response.data['ingredients']), 5)
+
+    def test_retrieve_as_anonymous(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.warm_up(url)
+        with self.assertNumQueries(1):
+            self.get(url)
+
+    def test_list_page(self):
+        url = '/api/recipes/?limit=10'
+        self.warm_up(url, self.reader)
+        with self.assertNumQueries(3):
+            response = self.get(url, self.reader)
+        self.assertEqual(len(response.data['results']), 10)
+
+
+class ReadModelParityTest(RecipeTestData, TestCase):
+    """Модели чтения отдают тот же JSON, что и сериализаторы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='pw'
+        )
+        Recipe.objects.create(
+            author=other, name='Другой рецепт', text='text', cooking_time=5
+        )
+        Follow.objects.create(user=cls.reader, following=other)
+
+    def setUp(self):
+        cache.clear()
+        local_profiles.clear()
+
+    def get_context(self, path, user):
+        request = Request(APIRequestFactory().get(path))
+        request.user = user
+        return {'request': request}
+
+    def assertSameJSON(self, expected, actual):
+        renderer = ORJSONRenderer()
+        self.assertEqual(
+            renderer.render(expected).decode(),
+            renderer.render(actual).decode()
+        )
+
+    def test_recipes(self):
+        for user in (self.reader, self.author, AnonymousUser()):
+            for query in (
+                '', '?fields=id,name,author.username',
+                '?omit=ingredients,author.is_subscribed',
+                '?fields=id,is_favorited,is_in_shopping_cart,image',
+            ):
+                with self.subTest(user=user, query=query):
+                    cache.clear()
+                    context = self.get_context(f'/api/recipes/{query}', user)
+                    recipes = annotate_viewer_flags(
+                        Recipe.objects.all(), user
+                    ).only('id', 'version', 'author_id')
+                    read_model = RecipeReadModel(context)
+                    self.assertSameJSON(
+                        RecipeGetSerializer(
+                            recipes, many=True, context=context
+                        ).data,
+                        read_model.render(read_model.rows(
+                            recipes.values_list(*read_model.row_fields)
+                        ))
+                    )
+
+    def test_subscriptions(self):
+        follows = Follow.objects.filter(user=self.reader)
+        for query in ('', '?fields=id,recipes', '?omit=recipes,email'):
+            with self.subTest(query=query):
+                context = self.get_context(
+                    f'/api/users/subscriptions/{query}', self.reader
+                )
+                self.assertSameJSON(
+                    FollowSerializer(follows, many=True, context=context).data,
+                    SubscriptionReadModel(context).render(list(
+                        follows.values_list('following_id', flat=True)
+                    ))
+                )
+
+
+class SyncCursorTest(TestCase):
+    """Курсор синхронизации не перешагивает поздно зафиксированные записи."""
+
+    def log(self, object_id, **kwargs):
+        return ChangeLogEntry.objects.create(
+            kind=ChangeLogEntry.RECIPE, object_id=object_id,
+            op=ChangeLogEntry.UPDATE, **kwargs
+        )
+
+    def sync(self, since):
+        cursor, _, changes = get_changes(AnonymousUser(), since, 100)
+        return cursor, changes[ChangeLogEntry.RECIPE]['upsert']
+
+    def test_late_commit_after_cursor(self):
+        cursor = get_cursor()
+        self.log(2, id=100)
+        cursor, upserted = self.sync(cursor)
+        self.assertEqual(upserted, [2])
+        # Запись долгой транзакции с меньшим id стала видна позже
+        self.log(1, id=50)
+        cursor, upserted = self.sync(cursor)
+        self.assertEqual(upserted, [1])
+        self.assertEqual(self.sync(cursor), (cursor, []))
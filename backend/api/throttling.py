@@ -0,0 +1,124 @@
+import threading
+import time
+
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import (AnonRateThrottle, ScopedRateThrottle,
+                                       UserRateThrottle)
+
+# GCRA: в ключе хранится одно число — теоретическое время прибытия (TAT)
+# следующего запроса. Проверка и обновление выполняются одним вызовом
+# скрипта на стороне Redis.
+GCRA_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+if new_tat - now > limit then
+    return tostring(new_tat - now - limit)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX',
+           math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+
+class LocalBucketStorage:
+    """Корзины токенов в памяти процесса, если общий кэш не Redis."""
+    max_keys = 100000
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def consume(self, key, interval, limit):
+        now = time.monotonic()
+        with self.lock:
+            tat = max(self.buckets.get(key, now), now)
+            new_tat = tat + interval
+            if new_tat - now > limit:
+                return new_tat - now - limit
+            if len(self.buckets) >= self.max_keys:
+                self.buckets = {
+                    bucket: value for bucket, value in self.buckets.items()
+                    if value > now
+                }
+            self.buckets[key] = new_tat
+            return 0
+
+
+class RedisBucketStorage:
+    def __init__(self, cache):
+        self.cache = cache
+        self.scripts = {}
+
+    def consume(self, key, interval, limit):
+        key = self.cache.make_key(key)
+        client = self.cache._cache.get_client(key, write=True)
+        script = self.scripts.get(id(client))
+        if script is None:
+            script = self.scripts[id(client)] = client.register_script(
+                GCRA_SCRIPT
+            )
+        return float(script(keys=[key], args=[interval, limit]))
+
+
+_storage = None
+
+
+def get_bucket_storage(cache):
+    global _storage
+    if _storage is None:
+        if isinstance(cache, RedisCache):
+            _storage = RedisBucketStorage(cache)
+        else:
+            _storage = LocalBucketStorage()
+    return _storage
+
+
+class TokenBucketMixin:
+    """
+    Корзина токенов вместо списка временных меток SimpleRateThrottle:
+    rate '100/min' даёт всплеск до 100 запросов и пополнение
+    со скоростью 100 запросов в минуту.
+    """
+    wait_time = None
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.wait_time = get_bucket_storage(self.cache).consume(
+            f'bucket:{self.key}',
+            self.duration / self.num_requests,
+            self.duration
+        )
+        return self.wait_time <= 0
+
+    def wait(self):
+        return self.wait_time
+
+
+class AnonTokenBucketThrottle(TokenBucketMixin, AnonRateThrottle):
+    pass
+
+
+class UserTokenBucketThrottle(TokenBucketMixin, UserRateThrottle):
+    pass
+
+
+class ScopedTokenBucketThrottle(TokenBucketMixin, ScopedRateThrottle):
+    """Отдельный лимит для вьюсетов и действий с throttle_scope."""
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -4,7 +4,8 @@ from rest_framework import routers
 from users.views import (FollowActionViewSet, FollowViewSet, UserLoginViewSet,
                          UserLogoutViewSet, UserViewSet)
 
-from .views import IngredientsViewSet, RecipesViewSet, TagsViewSet
+from .views import (EventTicketViewSet, IngredientsViewSet, RecipesViewSet,
+                    SyncViewSet, TagsViewSet)
 
 app_name = 'api'
 
@@ -29,6 +30,10 @@ router_v1.register('users', UserViewSet, basename='users')
 router_v1.register('tags', TagsViewSet, basename='tags')
 router_v1.register('ingredients', IngredientsViewSet, basename='ingredients')
 router_v1.register('recipes', RecipesViewSet, basename='recipes')
+router_v1.register('sync', SyncViewSet, basename='sync')
+router_v1.register(
+    'events/ticket', EventTicketViewSet, basename='event-ticket'
+)
 
 urlpatterns = [
     path('', include(router_v1.urls)),
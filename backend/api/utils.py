@@ -1,16 +1,94 @@
-from django.shortcuts import get_object_or_404
+from django.core.files.storage import default_storage
+from django.db.models import (Aggregate, CharField, Exists, OuterRef,
+                              Prefetch, Subquery, Value)
 from rest_framework import status
 from rest_framework.response import Response
 
-from recipes.models import Recipe
+from recipes.models import (ChangeLogEntry, FavouriteRecipes,
+                            IngredientsInRecipe, Recipe, ShoppingCart,
+                            TagsInRecipe)
+from .events import publish
+from .identity import get_object_or_404
+from .sync import USER_KINDS
+
+
+def image_url(name, request):
+    """
+    Как FileField.to_representation: абсолютный URL при наличии
+    запроса, иначе URL хранилища.
+    """
+    if not name:
+        return None
+    url = default_storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class GroupConcat(Aggregate):
+    """Значения группы одной строкой через запятую."""
+    function = 'GROUP_CONCAT'
+    output_field = CharField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            function='STRING_AGG',
+            template="%(function)s(CAST(%(expressions)s AS text), ',')",
+            **extra_context
+        )
+
+
+def annotate_viewer_flags(queryset, user):
+    """Флаги избранного и корзины пользователя запроса через EXISTS."""
+    if user.is_anonymous:
+        return queryset.annotate(
+            is_favorited=Value(False),
+            is_in_shopping_cart=Value(False),
+        )
+    return queryset.annotate(
+        is_favorited=Exists(FavouriteRecipes.objects.filter(
+            recipe=OuterRef('pk'), user=user
+        )),
+        is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+            recipe=OuterRef('pk'), user=user
+        )),
+    )
+
+
+def with_recipe_details(queryset):
+    """
+    Данные рецепта, не зависящие от пользователя, за два запроса:
+    рецепты с id тегов и ингредиенты вместе с Ingredient.
+    """
+    return queryset.annotate(
+        tag_ids=Subquery(
+            TagsInRecipe.objects
+            .filter(recipe=OuterRef('pk'))
+            .values('recipe')
+            .annotate(ids=GroupConcat('tags_id'))
+            .values('ids')
+        )
+    ).prefetch_related(
+        Prefetch(
+            'ingredients_in_recipe',
+            queryset=IngredientsInRecipe.objects.select_related('ingredient')
+        )
+    )
+
+
+def annotate_recipes(queryset, user):
+    """Всё, что нужно RecipeGetSerializer, без обращения к кэшу фрагментов."""
+    return with_recipe_details(annotate_viewer_flags(queryset, user))
 
 
 def delete_obj(request, pk, model):
-    recipe = get_object_or_404(Recipe, pk=pk)
-    if model.objects.filter(user=request.user, recipe=recipe).exists():
-        follow = get_object_or_404(model, user=request.user,
-                                   recipe=recipe)
-        follow.delete()
+    recipe = get_object_or_404(Recipe, pk)
+    relation = model.objects.filter(user=request.user, recipe=recipe).first()
+    if relation is not None:
+        relation.delete()
+        publish(request.user.id, USER_KINDS[model][0],
+                ChangeLogEntry.DELETE, recipe.pk)
         return Response(
             'Рецепт успешно удален из избранного/списка покупок',
             status=status.HTTP_204_NO_CONTENT
@@ -22,12 +100,14 @@ def delete_obj(request, pk, model):
 
 
 def post_obj(request, pk, model, serializer):
-    recipe = get_object_or_404(Recipe, pk=pk)
-    if model.objects.filter(user=request.user, recipe=recipe).exists():
+    recipe = get_object_or_404(Recipe, pk)
+    _, created = model.objects.get_or_create(user=request.user, recipe=recipe)
+    if not created:
         return Response(
             {'errors': 'Рецепт уже есть в избранном/списке покупок'},
             status=status.HTTP_400_BAD_REQUEST,
         )
-    model.objects.get_or_create(user=request.user, recipe=recipe)
+    publish(request.user.id, USER_KINDS[model][0], ChangeLogEntry.CREATE,
+            recipe.pk)
     data = serializer(recipe).data
     return Response(data, status=status.HTTP_201_CREATED)
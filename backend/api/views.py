@@ -1,22 +1,33 @@
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, mixins, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from recipes.models import (FavouriteRecipes, Follow, Ingredient, Recipe,
-                            IngredientsInRecipe, ShoppingCart, Tag)
+from recipes.models import (ChangeLogEntry, FavouriteRecipes, Follow,
+                            Ingredient, Recipe, ShoppingCart, ShoppingListJob,
+                            SimilarRecipe, Tag)
+from .bulk import export_recipes, import_recipes
+from .deletion import schedule_deletion
+from .events import make_ticket
+from .jobs import enqueue_shopping_list
+from .mixins import ReplicaReadMixin
 from .paginators import PageLimitPagination
 from .filters import IngredientFilter, RecipeFilter
 from .permissions import IsAdmin, IsAuthorOrReadOnly
+from .read_models import RecipeReadModel
 from .serializers import (FollowSerializer, IngredientSerializer,
                           RecipeFollowSerializer, RecipeGetSerializer,
-                          TagSerializer, RecipeCreateSerializer)
-from .utils import delete_obj, post_obj
+                          SimilarRecipeSerializer, TagSerializer,
+                          RecipeCreateSerializer)
+from .shopping_list import (RENDERERS, render_shopping_list,
+                            shopping_list_response)
+from .sync import CursorExpired, get_changes, get_cursor
+from .utils import annotate_viewer_flags, delete_obj, post_obj
 
 User = get_user_model()
 
@@ -30,6 +41,7 @@ class BaseViewSet(
 
 
 class TagsViewSet(
+    ReplicaReadMixin,
     BaseViewSet,
     mixins.RetrieveModelMixin
 ):
@@ -38,22 +50,25 @@ class TagsViewSet(
 
 
 class IngredientsViewSet(
+    ReplicaReadMixin,
     BaseViewSet,
     mixins.RetrieveModelMixin
 ):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    throttle_scope = 'search'
     filter_backends = (filters.SearchFilter,)
     filterset_class = IngredientFilter
     search_fields = ('^name',)
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     pagination_class = PageLimitPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = (IsAdmin | IsAuthorOrReadOnly,)
     queryset = Recipe.objects.all()
+    throttle_scope = None
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -61,18 +76,42 @@ class RecipesViewSet(viewsets.ModelViewSet):
         return RecipeCreateSerializer
 
     def get_queryset(self):
+        queryset = Recipe.objects.all()
         is_favorited = self.request.query_params.get('is_favorited') or 0
+        is_in_shopping_cart = self.request.query_params.get(
+            'is_in_shopping_cart') or 0
         if int(is_favorited) == 1:
-            return Recipe.objects.filter(
+            queryset = Recipe.objects.filter(
                 favourites__user=self.request.user
             )
-        is_in_shopping_cart = self.request.query_params.get(
-            'is_in_shopping_cart') or 0
-        if int(is_in_shopping_cart) == 1:
-            return Recipe.objects.filter(
+        elif int(is_in_shopping_cart) == 1:
+            queryset = Recipe.objects.filter(
                 cart__user=self.request.user
             )
-        return Recipe.objects.all()
+        if self.request.method == 'GET':
+            return annotate_viewer_flags(
+                queryset, self.request.user
+            ).only('id', 'version', 'author_id')
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """Список через модель чтения, без экземпляров Recipe."""
+        read_model = RecipeReadModel(self.get_serializer_context())
+        values = self.filter_queryset(self.get_queryset()).values_list(
+            *read_model.row_fields
+        )
+        page = self.paginate_queryset(values)
+        if page is not None:
+            return self.get_paginated_response(
+                read_model.render(read_model.rows(page))
+            )
+        return Response(read_model.render(read_model.rows(values)))
+
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= у списка покупок выбирает формат файла, а не рендерер DRF
+        if self.action in ('download_shopping_cart', 'shopping_cart_job'):
+            force = True
+        return super().perform_content_negotiation(request, force)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -80,6 +119,9 @@ class RecipesViewSet(viewsets.ModelViewSet):
         return Response(['Рецепт успешно удален'],
                         status=status.HTTP_204_NO_CONTENT)
 
+    def perform_destroy(self, instance):
+        schedule_deletion(instance)
+
     @action(
             detail=False, methods=['post'],
             permission_classes=[IsAuthenticated]
@@ -111,34 +153,107 @@ class RecipesViewSet(viewsets.ModelViewSet):
 
     @action(
             detail=False, methods=('GET',),
-            permission_classes=[IsAuthenticated]
+            permission_classes=[IsAuthenticated],
+            throttle_scope='cart_download'
         )
     def download_shopping_cart(self, request):
         if not ShoppingCart.objects.filter(user=self.request.user).exists():
             return Response(
                 ['В корзине нет товаров'], status=status.HTTP_400_BAD_REQUEST)
-        ingredients = (
-            IngredientsInRecipe.objects
-            .filter(recipe__cart__user=request.user)
-            .values('ingredient')
-            .annotate(total_amount=Sum('amount'))
-            .values_list(
-                'ingredient__name',
-                'total_amount',
-                'ingredient__measurement_unit'
+        file_format = self.request.query_params.get('format') or 'txt'
+        if file_format not in RENDERERS:
+            return Response(
+                {'errors': f'Неизвестный формат файла: {file_format}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if self.request.query_params.get('async') == '1':
+            job = enqueue_shopping_list(request.user, file_format)
+            if job.status == ShoppingListJob.DONE:
+                return shopping_list_response(job.content, job.format)
+            return Response(
+                {'job_id': job.id, 'status': job.status},
+                status=status.HTTP_202_ACCEPTED
+            )
+        return shopping_list_response(
+            render_shopping_list(request.user, file_format), file_format
+        )
+
+    @action(
+            detail=False, methods=('GET',),
+            permission_classes=[IsAuthenticated],
+            url_path=r'download_shopping_cart/(?P<job_id>\d+)',
+            throttle_scope='cart_download'
+        )
+    def shopping_cart_job(self, request, job_id):
+        job = get_object_or_404(
+            ShoppingListJob.objects.defer('content'),
+            pk=job_id, user=request.user
+        )
+        if job.status == ShoppingListJob.DONE:
+            job.refresh_from_db(fields=('content',))
+            return shopping_list_response(job.content, job.format)
+        if job.status == ShoppingListJob.FAILED:
+            return Response(
+                {'job_id': job.id, 'status': job.status,
+                 'errors': job.error},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        return Response(
+            {'job_id': job.id, 'status': job.status},
+            status=status.HTTP_202_ACCEPTED
         )
 
-        text = ''
-        for ingredient in ingredients:
-            text += '{} - {} {}. \n'.format(*ingredient)
+    @action(detail=True, methods=('GET',), permission_classes=[AllowAny])
+    def similar(self, request, pk):
+        """
+        Похожие рецепты по ингредиентам из заранее посчитанной таблицы.
+        """
+        recipe = get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        similar = SimilarRecipe.objects.filter(
+            recipe=recipe, similar__is_deleted=False
+        ).select_related('similar').only(
+            'score', 'similar__id', 'similar__name', 'similar__image',
+            'similar__cooking_time'
+        )[:settings.RECIPE_SIMILARITY['TOP_K']]
+        return Response(
+            SimilarRecipeSerializer(
+                similar, many=True, context=self.get_serializer_context()
+            ).data
+        )
 
-        file = HttpResponse(
-            f'Покупки:\n {text}', content_type='text/plain'
+    @action(
+            detail=False, methods=('GET',),
+            permission_classes=[IsAdmin],
+            url_path='export'
         )
+    def export_recipes(self, request):
+        """Все рецепты в формате NDJSON, отдаются потоком."""
+        embed_images = self.request.query_params.get('images') == 'base64'
+        response = StreamingHttpResponse(
+            export_recipes(Recipe.objects.all(), embed_images),
+            content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"'
+        )
+        return response
 
-        file['Content-Disposition'] = ('attachment; filename=cart.txt')
-        return file
+    @action(
+            detail=False, methods=('POST',),
+            permission_classes=[IsAdmin],
+            url_path='import'
+        )
+    def import_recipes(self, request):
+        """
+        Загрузка рецептов из тела запроса в формате NDJSON. Тело читается
+        построчно, без разбора парсерами DRF.
+        """
+        result = import_recipes(request.stream or (), request.user)
+        return Response(
+            result,
+            status=(status.HTTP_201_CREATED if result['created']
+                    else status.HTTP_400_BAD_REQUEST)
+        )
 
 
 class FollowListViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
@@ -180,3 +295,70 @@ class FollowActionViewSet(
         context = super().get_serializer_context()
         context['id'] = int(self.kwargs.get('id'))
         return context
+
+
+class EventTicketViewSet(viewsets.GenericViewSet):
+    """
+    Билет для /api/events/?ticket=: EventSource не передаёт заголовок
+    Authorization, а токен в адресе попал бы в журналы доступа.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def create(self, request):
+        return Response(
+            {'ticket': make_ticket(request.user.id),
+             'expires_in': settings.EVENTS['TICKET_MAX_AGE']},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class SyncViewSet(viewsets.GenericViewSet):
+    """
+    Дельта-синхронизация клиентов. Без since возвращает текущий курсор
+    (его берут после полной загрузки списков), с since — изменения после
+    курсора: рецепты целиком, избранное, список покупок и подписки — id.
+    """
+    permission_classes = (AllowAny,)
+
+    def list(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'cursor': get_cursor()})
+        try:
+            cursor, has_more, changes = get_changes(
+                request.user, int(since), settings.CHANGE_LOG['SYNC_LIMIT']
+            )
+        except ValueError:
+            return Response(
+                {'errors': 'since должен быть числом'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except CursorExpired:
+            return Response(
+                {'errors': 'Курсор устарел, нужна полная синхронизация',
+                 'cursor': get_cursor()},
+                status=status.HTTP_410_GONE
+            )
+        recipes = changes[ChangeLogEntry.RECIPE]
+        read_model = RecipeReadModel(self.get_serializer_context())
+        values = annotate_viewer_flags(
+            Recipe.objects.filter(id__in=recipes['upsert']), request.user
+        ).values_list(*read_model.row_fields)
+        data = {
+            'cursor': cursor,
+            'has_more': has_more,
+            'recipes': {
+                'upserted': read_model.render(read_model.rows(values)),
+                'deleted': recipes['delete'],
+            },
+        }
+        for name, kind in (
+            ('favorites', ChangeLogEntry.FAVORITE),
+            ('shopping_cart', ChangeLogEntry.SHOPPING_CART),
+            ('subscriptions', ChangeLogEntry.FOLLOW),
+        ):
+            data[name] = {
+                'added': changes[kind]['upsert'],
+                'removed': changes[kind]['delete'],
+            }
+        return Response(data)
@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from api.events import sse_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Поток событий обслуживается отдельно от Django: соединение
+    # держит только корутину, а не поток обработчика запроса
+    if scope['type'] == 'http' and scope['path'] == '/api/events/':
+        return await sse_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -50,10 +50,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
+    'api.middleware.IdentityMapMiddleware',
+    'api.middleware.SlowQueryMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -92,10 +96,163 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', default='True'
+        ) == 'True',
+        # PgBouncer в режиме transaction не поддерживает серверные курсоры;
+        # умолчание совпадает с POOL_MODE в infra/docker-compose.yml
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_POOL_MODE', default='session'
+        ) == 'transaction',
     }
 }
 
+# Реплики для чтения: через запятую хосты PostgreSQL (host или host:port)
+# либо пути к файлам, если используется SQLite
+DB_REPLICAS = [
+    replica for replica in os.getenv('DB_REPLICAS', default='').split(',')
+    if replica
+]
+for index, replica in enumerate(DB_REPLICAS, start=1):
+    replica_settings = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if replica_settings['ENGINE'].endswith('sqlite3'):
+        replica_settings['NAME'] = replica
+    else:
+        host, _, port = replica.partition(':')
+        replica_settings['HOST'] = host
+        replica_settings['PORT'] = port or replica_settings['PORT']
+    DATABASES[f'replica_{index}'] = replica_settings
+
+DATABASE_ROUTERS = ['api.db.ReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = int(
+    os.getenv('DB_REPLICA_STICKY_SECONDS', default=10)
+)
+
+DB_CONN_SLOW_MS = int(os.getenv('DB_CONN_SLOW_MS', default=100))
+DB_CONN_METRICS_EVERY = int(os.getenv('DB_CONN_METRICS_EVERY', default=1000))
+
+PGBOUNCER = {
+    'HOST': os.getenv('PGBOUNCER_HOST', default='pgbouncer'),
+    'PORT': os.getenv('PGBOUNCER_PORT', default='6432'),
+    'USER': os.getenv('POSTGRES_USER', default='postgres'),
+    'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
+USER_PROFILE_CACHE = {
+    # LRU процесса не сбрасывается из других процессов, поэтому LOCAL_TTL —
+    # предел, сколько после изменения профиля видны старые данные
+    'LOCAL_SIZE': int(os.getenv('USER_PROFILE_LOCAL_SIZE', default=4096)),
+    'LOCAL_TTL': int(os.getenv('USER_PROFILE_LOCAL_TTL', default=30)),
+    'TIMEOUT': int(os.getenv('USER_PROFILE_CACHE_TIMEOUT', default=3600)),
+}
+
+FEED = {
+    # Рецепты авторов с большим числом подписчиков читаются при запросе;
+    # список таких авторов пересчитывает refresh_feed_pull_authors
+    'FANOUT_LIMIT': int(os.getenv('FEED_FANOUT_LIMIT', default=10000)),
+    'PULL_AUTHORS_TIMEOUT': int(
+        os.getenv('FEED_PULL_AUTHORS_TIMEOUT', default=300)
+    ),
+    'BACKFILL': int(os.getenv('FEED_BACKFILL', default=50)),
+    'WORKERS': int(os.getenv('FEED_WORKERS', default=2)),
+}
+
+AUTHOR_SUGGESTIONS = {
+    'TOP_N': int(os.getenv('AUTHOR_SUGGESTIONS_TOP_N', default=20)),
+    'FAVOURITE_WEIGHT': float(
+        os.getenv('AUTHOR_SUGGESTIONS_FAVOURITE_WEIGHT', default=0.5)
+    ),
+    'CO_FAVOURITE_WEIGHT': float(
+        os.getenv('AUTHOR_SUGGESTIONS_CO_FAVOURITE_WEIGHT', default=0.25)
+    ),
+    'MAX_CO_FANS': int(
+        os.getenv('AUTHOR_SUGGESTIONS_MAX_CO_FANS', default=50)
+    ),
+}
+
+PASSWORD_HASHING = {
+    'WORKERS': int(os.getenv('PASSWORD_HASHING_WORKERS', default=2)),
+    'QUEUE_SIZE': int(os.getenv('PASSWORD_HASHING_QUEUE_SIZE', default=8)),
+    'TIMEOUT': float(os.getenv('PASSWORD_HASHING_TIMEOUT', default=5)),
+}
+
+RECIPE_FRAGMENT_TIMEOUT = int(
+    os.getenv('RECIPE_FRAGMENT_TIMEOUT', default=24 * 60 * 60)
+)
+
+IMAGE_UPLOAD_LIMITS = {
+    'MAX_SIZE': int(os.getenv('IMAGE_MAX_SIZE', default=5 * 1024 * 1024)),
+    'MAX_WIDTH': int(os.getenv('IMAGE_MAX_WIDTH', default=4096)),
+    'MAX_HEIGHT': int(os.getenv('IMAGE_MAX_HEIGHT', default=4096)),
+    'MAX_PIXELS': int(os.getenv('IMAGE_MAX_PIXELS', default=16 * 1024 * 1024)),
+}
+
+RECIPE_SIMILARITY = {
+    'NUM_PERM': int(os.getenv('RECIPE_SIMILARITY_NUM_PERM', default=128)),
+    'BANDS': int(os.getenv('RECIPE_SIMILARITY_BANDS', default=32)),
+    'TOP_K': int(os.getenv('RECIPE_SIMILARITY_TOP_K', default=10)),
+    'MIN_SCORE': float(os.getenv('RECIPE_SIMILARITY_MIN_SCORE', default=0.2)),
+    'MAX_BUCKET': int(os.getenv('RECIPE_SIMILARITY_MAX_BUCKET', default=200)),
+    # 0 — пересчёт после фиксации в потоке запроса
+    'WORKERS': int(os.getenv('RECIPE_SIMILARITY_WORKERS', default=1)),
+}
+
+RECIPE_BULK = {
+    'BATCH_SIZE': int(os.getenv('RECIPE_BULK_BATCH_SIZE', default=500)),
+    'EXPORT_CHUNK_SIZE': int(
+        os.getenv('RECIPE_BULK_EXPORT_CHUNK_SIZE', default=2000)
+    ),
+}
+
+CHANGE_LOG = {
+    'RETENTION_DAYS': int(os.getenv('CHANGE_LOG_RETENTION_DAYS', default=30)),
+    'SYNC_LIMIT': int(os.getenv('CHANGE_LOG_SYNC_LIMIT', default=500)),
+}
+
+EVENTS = {
+    # api.events.RedisBroker раздаёт события между процессами
+    'BROKER': os.getenv('EVENTS_BROKER', default='api.events.LocalBroker'),
+    'REDIS_URL': os.getenv(
+        'EVENTS_REDIS_URL', default='redis://localhost:6379/0'
+    ),
+    'QUEUE_SIZE': int(os.getenv('EVENTS_QUEUE_SIZE', default=32)),
+    'KEEPALIVE': float(os.getenv('EVENTS_KEEPALIVE', default=15)),
+    # Срок билета /api/events/ticket/ для подключения с ?ticket=
+    'TICKET_MAX_AGE': int(os.getenv('EVENTS_TICKET_MAX_AGE', default=60)),
+}
+
+DELETION = {
+    'BATCH_SIZE': int(os.getenv('DELETION_BATCH_SIZE', default=1000)),
+    # 0 — удаление внутри запроса, без пометки и фонового потока
+    'WORKERS': int(os.getenv('DELETION_WORKERS', default=1)),
+}
+
+SLOW_QUERIES = {
+    'ENABLED': os.getenv('SLOW_QUERIES_ENABLED', default='False') == 'True',
+    'THRESHOLD_MS': float(os.getenv('SLOW_QUERIES_THRESHOLD_MS', default=100)),
+    'SAMPLE_RATE': float(os.getenv('SLOW_QUERIES_SAMPLE_RATE', default=1)),
+    'PATH': os.getenv(
+        'SLOW_QUERIES_PATH',
+        default=os.path.join(BASE_DIR, 'logs', 'slow_queries.log')
+    ),
+    'MAX_BYTES': int(
+        os.getenv('SLOW_QUERIES_MAX_BYTES', default=10 * 1024 * 1024)
+    ),
+    'BACKUP_COUNT': int(os.getenv('SLOW_QUERIES_BACKUP_COUNT', default=5)),
+}
+
 AUTH_USER_MODEL = 'users.User'
 
 # Password validation
@@ -134,6 +291,22 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
     'SEARCH_PARAM': 'name',
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.UserTokenBucketThrottle',
+        'api.throttling.AnonTokenBucketThrottle',
+        'api.throttling.ScopedTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'user': os.getenv('THROTTLE_USER', default='10000/day'),
+        'anon': os.getenv('THROTTLE_ANON', default='1000/day'),
+        'search': os.getenv('THROTTLE_SEARCH', default='60/min'),
+        'cart_download': os.getenv('THROTTLE_CART_DOWNLOAD', default='10/min'),
+        'login': os.getenv('THROTTLE_LOGIN', default='10/min'),
+    },
 }
 
 
@@ -150,17 +323,32 @@ DJOSER = {
         'user': ['djoser.permissions.CurrentUserOrAdminOrReadOnly'],
         'user_list': ['rest_framework.permissions.AllowAny']
     },
-    'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.AnonRateThrottle',
-    ],
-    'DEFAULT_THROTTLE_RATES': {
-        'user': '10000/day',  # Лимит для UserRateThrottle
-        'anon': '1000/day',  # Лимит для AnonRateThrottle
-    }
 }
 
 
+SHOPPING_LIST_JOBS = {
+    'BACKEND': os.getenv(
+        'SHOPPING_LIST_JOB_BACKEND',
+        default='api.jobs.LocalPoolBackend'
+    ),
+    'OPTIONS': {
+        'workers': int(os.getenv('SHOPPING_LIST_JOB_WORKERS', default=2)),
+    },
+    'STALE_AFTER': int(
+        os.getenv('SHOPPING_LIST_JOB_STALE_AFTER', default=300)
+    ),
+    # задачи и файлы старше KEEP_FOR секунд удаляются
+    'KEEP_FOR': int(
+        os.getenv('SHOPPING_LIST_JOB_KEEP_FOR', default=24 * 60 * 60)
+    ),
+}
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
 
@@ -0,0 +1,14 @@
+"""
+Настройки gunicorn. Потоковые воркеры (gthread) обслуживают несколько
+запросов в процессе одновременно, поэтому пул хеширования паролей
+из users/hashing.py ограничивает CPU, занятый входами, а лишние входы
+сразу получают 503 и не занимают потоки, которые читают рецепты.
+Каждый поток держит своё соединение с БД (CONN_MAX_AGE): всего их
+до GUNICORN_WORKERS * GUNICORN_THREADS.
+"""
+import os
+
+bind = '0:8000'
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', default=2))
+threads = int(os.getenv('GUNICORN_THREADS', default=8))
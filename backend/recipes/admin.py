@@ -1,7 +1,41 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F
+from django.utils.functional import cached_property
 
+from api.deletion import ScheduledDeletionAdminMixin
 from .models import (FavouriteRecipes, Follow, Ingredient, Recipe,
                      IngredientsInRecipe, TagsInRecipe, ShoppingCart, Tag)
+from .similarity import schedule_update
+
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Для больших таблиц без фильтров берёт оценку числа строк
+    из статистики PostgreSQL вместо точного COUNT(*).
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Tag)
@@ -11,63 +45,116 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     list_display = ('name', 'measurement_unit',)
+    search_fields = ('name__startswith',)
 
 
 class RecipeTagsInLine(admin.TabularInline):
     model = TagsInRecipe
     extra = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('recipe', 'tags')
+
 
 class RecipeIngredientsInLine(admin.TabularInline):
     model = IngredientsInRecipe
     extra = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ScheduledDeletionAdminMixin, LargeTableAdmin):
     list_display = ('id',
                     'name',
                     'author',
                     'text',
                     'cooking_time',
-                    'image',)
-    list_filter = ('name', 'author__username',)
-    search_fields = ('name',)
+                    'image',
+                    'is_deleted',)
+    list_filter = ('tags', 'is_deleted')
+    list_select_related = ('author',)
+    search_fields = ('name__startswith',)
+    autocomplete_fields = ('author',)
     inlines = (RecipeTagsInLine, RecipeIngredientsInLine)
 
+    def get_queryset(self, request):
+        # Рецепты, которые ещё удаляются в фоне, тоже видны, а без
+        # фильтров в запросе нет WHERE и работает оценка числа строк
+        queryset = Recipe._base_manager.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # теги и ингредиенты меняют кэшированное представление рецепта
+        Recipe.objects.filter(pk=form.instance.pk).update(
+            version=F('version') + 1
+        )
+        schedule_update([form.instance.pk])
+
+
+class RecipeRelationAdmin(LargeTableAdmin):
+    def bump_version(self, obj):
+        Recipe.objects.filter(pk=obj.recipe_id).update(
+            version=F('version') + 1
+        )
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.bump_version(obj)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.bump_version(obj)
+
 
 @admin.register(IngredientsInRecipe)
-class IngredientsInRecipeAdmin(admin.ModelAdmin):
+class IngredientsInRecipeAdmin(RecipeRelationAdmin):
     list_display = ('recipe', 'ingredient',)
-    list_filter = ('recipe',)
-    search_fields = ('recipe',)
+    list_select_related = ('recipe', 'ingredient')
+    raw_id_fields = ('recipe', 'ingredient')
+    search_fields = ('recipe__name__startswith',)
+
+    def bump_version(self, obj):
+        super().bump_version(obj)
+        schedule_update([obj.recipe_id])
 
 
 @admin.register(TagsInRecipe)
-class TagsInRecipeAdmin(admin.ModelAdmin):
+class TagsInRecipeAdmin(RecipeRelationAdmin):
     list_display = ('recipe', 'tags',)
-    list_filter = ('recipe',)
-    search_fields = ('recipe',)
+    list_filter = ('tags',)
+    list_select_related = ('recipe', 'tags')
+    raw_id_fields = ('recipe',)
+    search_fields = ('recipe__name__startswith',)
 
 
 @admin.register(FavouriteRecipes)
-class FavouriteRecipesAdmin(admin.ModelAdmin):
+class FavouriteRecipesAdmin(LargeTableAdmin):
     list_display = ('recipe', 'user',)
-    list_filter = ('user',)
-    search_fields = ('user',)
+    list_select_related = ('recipe', 'user')
+    raw_id_fields = ('recipe', 'user')
+    search_fields = ('user__username__startswith',)
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('user', 'following',)
-    list_filter = ('user',)
-    search_fields = ('user',)
+    list_select_related = ('user', 'following')
+    raw_id_fields = ('user', 'following')
+    search_fields = ('user__username__startswith',)
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdmin):
     list_display = ('recipe', 'user',)
-    list_filter = ('user',)
-    search_fields = ('user',)
+    list_select_related = ('recipe', 'user')
+    raw_id_fields = ('recipe', 'user')
+    search_fields = ('user__username__startswith',)
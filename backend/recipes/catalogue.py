@@ -0,0 +1,71 @@
+"""
+Разбор файлов каталога ингредиентов поставщиков.
+Модуль не импортирует модели, чтобы его можно было выполнять
+в дочерних процессах пула.
+"""
+import csv
+import json
+import time
+
+NAME_MAX_LENGTH = 100
+UNIT_MAX_LENGTH = 200
+
+
+def normalize(name, measurement_unit):
+    """
+    Название и единица без лишних пробелов, обрезанные по длине полей;
+    регистр сохраняется.
+    """
+    name = ' '.join(str(name).split())[:NAME_MAX_LENGTH]
+    measurement_unit = ' '.join(
+        str(measurement_unit).split()
+    )[:UNIT_MAX_LENGTH]
+    if not name or not measurement_unit:
+        return None
+    return name, measurement_unit
+
+
+def row_key(name, measurement_unit):
+    """Ключ для поиска дублей без учёта регистра и пробелов."""
+    row = normalize(name, measurement_unit)
+    if row is None:
+        return None
+    return row[0].lower(), row[1].lower()
+
+
+def read_rows(path):
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for item in json.load(f):
+                yield item.get('name', ''), item.get('measurement_unit', '')
+        return
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.reader(f):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def parse_file(path, start, chunk_size, queue):
+    """
+    Читает файл с позиции start и кладёт нормализованные порции
+    в ограниченную очередь: ('chunk', path, end, rows).
+    В конце отправляет ('done', path, parsed, seconds).
+    """
+    started = time.perf_counter()
+    chunk = []
+    position = 0
+    for position, row in enumerate(read_rows(path), start=1):
+        if position <= start:
+            continue
+        item = normalize(*row)
+        if item is not None:
+            chunk.append(item)
+        if len(chunk) >= chunk_size:
+            queue.put(('chunk', path, position, chunk))
+            chunk = []
+    if chunk:
+        queue.put(('chunk', path, position, chunk))
+    queue.put((
+        'done', path, max(position - start, 0),
+        time.perf_counter() - started
+    ))
@@ -0,0 +1,185 @@
+"""
+Поиск и слияние почти одинаковых ингредиентов: варианты написания,
+регистр, ё/е, разные записи одной единицы измерения. Названия
+сравниваются по символьным n-граммам (коэффициент Дайса) матричным
+умножением внутри блоков с одинаковой единицей и первыми буквами,
+поэтому работа растёт с размером блоков, а не квадратом каталога.
+"""
+import re
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+
+from .models import Ingredient, IngredientsInRecipe
+
+# Запись единицы -> (единица, к которой приводится, множитель)
+UNIT_ALIASES = {
+    'г': ('г', 1), 'гр': ('г', 1), 'гр.': ('г', 1), 'грамм': ('г', 1),
+    'g': ('г', 1), 'кг': ('г', 1000), 'килограмм': ('г', 1000),
+    'мл': ('мл', 1), 'ml': ('мл', 1), 'л': ('мл', 1000),
+    'литр': ('мл', 1000),
+    'шт': ('шт.', 1), 'шт.': ('шт.', 1), 'штук': ('шт.', 1),
+    'штука': ('шт.', 1),
+    'ст. л.': ('ст. л.', 1), 'ст.л.': ('ст. л.', 1),
+    'столовая ложка': ('ст. л.', 1),
+    'ч. л.': ('ч. л.', 1), 'ч.л.': ('ч. л.', 1),
+    'чайная ложка': ('ч. л.', 1),
+}
+MAX_BLOCK = 2000
+
+non_word = re.compile(r'[^\w%]+')
+numbers = re.compile(r'\d+')
+
+
+def normalize_name(name):
+    return ' '.join(non_word.sub(' ', name.lower().replace('ё', 'е')).split())
+
+
+def normalize_unit(unit):
+    unit = ' '.join(unit.lower().split())
+    return UNIT_ALIASES.get(unit, (unit, 1))
+
+
+def ngram_matrix(names, size):
+    """Бинарная матрица (названия, n-граммы) по названиям с отступами."""
+    vocabulary = {}
+    rows = []
+    columns = []
+    for row, name in enumerate(names):
+        padded = f' {name} '
+        for gram in {padded[i:i + size]
+                     for i in range(max(len(padded) - size + 1, 1))}:
+            rows.append(row)
+            columns.append(vocabulary.setdefault(gram, len(vocabulary)))
+    matrix = np.zeros((len(names), len(vocabulary)), dtype=np.float32)
+    matrix[rows, columns] = 1
+    return matrix
+
+
+def similar_pairs(names, threshold, size):
+    """Пары индексов с коэффициентом Дайса не ниже threshold."""
+    matrix = ngram_matrix(names, size)
+    common = matrix @ matrix.T
+    sizes = matrix.sum(axis=1)
+    dice = 2 * common / (sizes[:, None] + sizes[None, :])
+    left, right = np.nonzero(np.triu(dice >= threshold, k=1))
+    return zip(left.tolist(), right.tolist(), dice[left, right].tolist())
+
+
+def blocks(items, prefix):
+    """
+    Группы по единице, числам в названии (жирность, номер) и первым
+    prefix буквам. Слишком большие группы делятся по более длинному
+    префиксу.
+    """
+    grouped = {}
+    for item in items:
+        grouped.setdefault((
+            item['unit'], tuple(numbers.findall(item['name'])),
+            item['name'][:prefix]
+        ), []).append(item)
+    for group in grouped.values():
+        if len(group) > MAX_BLOCK and any(
+                len(item['name']) > prefix for item in group
+        ):
+            yield from blocks(group, prefix + 1)
+        else:
+            yield group
+
+
+def find_clusters(threshold=0.9, prefix=2, size=3):
+    """
+    Кластеры дубликатов: список словарей canonical/duplicates, где
+    каждый ингредиент — dict с id, названием, единицей, множителем
+    пересчёта и числом рецептов. Основным становится ингредиент
+    в самой мелкой единице (количества остаются целыми), среди них —
+    самый используемый.
+    """
+    items = []
+    for pk, name, unit, uses in Ingredient.objects.annotate(
+            uses=Count('ingredients_in_recipe')
+    ).values_list('id', 'name', 'measurement_unit', 'uses').iterator():
+        base_unit, factor = normalize_unit(unit)
+        items.append({
+            'id': pk, 'raw': f'{name} ({unit})',
+            'name': normalize_name(name), 'unit': base_unit,
+            'factor': factor, 'uses': uses,
+        })
+    parents = {}
+
+    def find(pk):
+        while parents.get(pk, pk) != pk:
+            pk = parents[pk]
+        return pk
+
+    scores = {}
+    for block in blocks(items, prefix):
+        if len(block) < 2:
+            continue
+        for left, right, score in similar_pairs(
+                [item['name'] for item in block], threshold, size
+        ):
+            left, right = block[left], block[right]
+            scores[(left['id'], right['id'])] = score
+            scores[(right['id'], left['id'])] = score
+            parents[find(left['id'])] = find(right['id'])
+
+    by_id = {item['id']: item for item in items}
+    members = {}
+    # Корни не попадают в ключи parents, но входят в свои кластеры
+    for pk in set(parents) | set(parents.values()):
+        members.setdefault(find(pk), []).append(by_id[pk])
+    clusters = []
+    for group in members.values():
+        group.sort(
+            key=lambda item: (item['factor'], -item['uses'], item['id'])
+        )
+        canonical = group[0]
+        # Цепочка похожих пар не сливает непохожие концы: каждый
+        # дубликат должен быть похож на основной ингредиент
+        duplicates = [
+            dict(item, score=scores[(canonical['id'], item['id'])])
+            for item in group[1:]
+            if (canonical['id'], item['id']) in scores
+            and item['factor'] % canonical['factor'] == 0
+        ]
+        if duplicates:
+            clusters.append({'canonical': canonical, 'duplicates': duplicates})
+    clusters.sort(key=lambda cluster: cluster['canonical']['name'])
+    return clusters
+
+
+def merge_cluster(cluster):
+    """
+    Переносит строки рецептов дубликатов на основной ингредиент
+    с пересчётом количества. Если в рецепте есть оба, количества
+    складываются. Возвращает id затронутых рецептов.
+    """
+    canonical = cluster['canonical']
+    recipe_ids = set()
+    for duplicate in cluster['duplicates']:
+        factor = duplicate['factor'] // canonical['factor']
+        rows = IngredientsInRecipe.objects.filter(ingredient=duplicate['id'])
+        recipe_ids.update(rows.values_list('recipe_id', flat=True))
+        shared = IngredientsInRecipe.objects.filter(
+            ingredient=canonical['id'],
+            recipe__in=rows.values('recipe')
+        )
+        shared.update(amount=F('amount') + Subquery(
+            rows.filter(recipe=OuterRef('recipe')).values('amount')[:1]
+        ) * factor)
+        rows.filter(recipe__in=shared.values('recipe')).delete()
+        rows.update(ingredient=canonical['id'], amount=F('amount') * factor)
+        Ingredient.objects.filter(pk=duplicate['id']).delete()
+    return recipe_ids
+
+
+def merge_clusters(clusters, batch_size=100):
+    """Слияние пачками кластеров, каждая пачка в своей транзакции."""
+    recipe_ids = set()
+    for start in range(0, len(clusters), batch_size):
+        with transaction.atomic():
+            for cluster in clusters[start:start + batch_size]:
+                recipe_ids |= merge_cluster(cluster)
+    return recipe_ids
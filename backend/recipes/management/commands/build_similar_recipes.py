@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import build_all
+
+
+class Command(BaseCommand):
+    """
+    Полный пересчёт похожих рецептов: MinHash-сигнатуры, LSH-корзины
+    и top-k соседей. Между пересчётами списки обновляются
+    при изменении ингредиентов рецепта.
+    """
+    help = 'rebuild MinHash signatures and similar recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', default=2000, type=int,
+                            help='recipes hashed per numpy batch')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        recipes, neighbours = build_all(options['chunk_size'])
+        print(f'{recipes} recipes, {neighbours} neighbours '
+              f'in {time.perf_counter() - started:.1f}s')
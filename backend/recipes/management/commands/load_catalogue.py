@@ -0,0 +1,157 @@
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+from queue import Empty
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.catalogue import parse_file, row_key
+from recipes.models import Ingredient
+
+DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+
+
+class Command(BaseCommand):
+    """
+    Параллельная загрузка каталогов ингредиентов из нескольких csv/json
+    файлов: разбор в пуле процессов, запись одним процессом пачками,
+    продолжение с контрольной точки после прерывания.
+    """
+    help = 'loading ingredients from many csv/json files in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source',
+            nargs='?',
+            default='.',
+            help='directory or glob, relative to data/ or absolute'
+        )
+        parser.add_argument('--workers', default=os.cpu_count(), type=int)
+        parser.add_argument('--chunk-size', default=5000, type=int)
+        parser.add_argument('--queue-size', default=16, type=int)
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(DATA_ROOT, '.load_catalogue.json'),
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='ignore the checkpoint and load all files again'
+        )
+
+    def get_files(self, source):
+        if not os.path.isabs(source):
+            source = os.path.join(DATA_ROOT, source)
+        if os.path.isdir(source):
+            source = os.path.join(source, '*')
+        return sorted(
+            path for path in glob.glob(source)
+            if path.endswith(('.csv', '.json'))
+        )
+
+    def load_checkpoint(self, path, restart):
+        if restart or not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_checkpoint(self, path, checkpoint):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, path)
+
+    def handle(self, *args, **options):
+        checkpoint_path = options['checkpoint']
+        files = [
+            path for path in self.get_files(options['source'])
+            if os.path.abspath(path) != os.path.abspath(checkpoint_path)
+        ]
+        if not files:
+            raise CommandError('Не найдено ни одного csv/json файла')
+
+        checkpoint = self.load_checkpoint(checkpoint_path, options['restart'])
+        pending = [
+            path for path in files
+            if not checkpoint.get(path, {}).get('done')
+        ]
+        if not pending:
+            print('All files are already loaded')
+            return
+
+        existing = {
+            row_key(*row) for row in
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        }
+        stats = {path: {'inserted': 0} for path in pending}
+        started = time.perf_counter()
+
+        with Manager() as manager, ProcessPoolExecutor(
+                max_workers=max(1, min(options['workers'], len(pending)))
+        ) as executor:
+            queue = manager.Queue(maxsize=options['queue_size'])
+            futures = [
+                executor.submit(
+                    parse_file, path,
+                    checkpoint.get(path, {}).get('position', 0),
+                    options['chunk_size'], queue
+                )
+                for path in pending
+            ]
+            remaining = len(pending)
+            while remaining:
+                try:
+                    message = queue.get(timeout=1)
+                except Empty:
+                    for future in futures:
+                        if future.done() and future.exception():
+                            raise CommandError(
+                                f'Ошибка разбора файла: {future.exception()}'
+                            )
+                    continue
+                if message[0] == 'done':
+                    _, path, parsed, seconds = message
+                    checkpoint.setdefault(path, {})['done'] = True
+                    self.save_checkpoint(checkpoint_path, checkpoint)
+                    stats[path].update(parsed=parsed, seconds=seconds)
+                    remaining -= 1
+                    continue
+
+                _, path, position, rows = message
+                new_rows = []
+                for row in rows:
+                    key = row_key(*row)
+                    if key not in existing:
+                        existing.add(key)
+                        new_rows.append(row)
+                with transaction.atomic():
+                    Ingredient.objects.bulk_create(
+                        Ingredient(name=name, measurement_unit=unit)
+                        for name, unit in new_rows
+                    )
+                stats[path]['inserted'] += len(new_rows)
+                checkpoint.setdefault(path, {})['position'] = position
+                self.save_checkpoint(checkpoint_path, checkpoint)
+            for future in futures:
+                future.result()
+
+        total_parsed = total_inserted = 0
+        for path, file_stats in stats.items():
+            parsed = file_stats.get('parsed', 0)
+            seconds = file_stats.get('seconds') or 1e-9
+            total_parsed += parsed
+            total_inserted += file_stats['inserted']
+            print(
+                f'{os.path.basename(path)}: {parsed} rows, '
+                f'{file_stats["inserted"]} new, {parsed / seconds:.0f} rows/s'
+            )
+        elapsed = time.perf_counter() - started
+        print(
+            f'Total: {total_parsed} rows, {total_inserted} new '
+            f'in {elapsed:.1f}s ({total_parsed / elapsed:.0f} rows/s)'
+        )
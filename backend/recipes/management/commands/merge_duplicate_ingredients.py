@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_recipe_versions
+from recipes.dedup import find_clusters, merge_clusters
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Поиск почти одинаковых ингредиентов и слияние их в один: строки
+    рецептов переносятся на основной ингредиент, дубликаты удаляются.
+    С --dry-run только печатает найденные кластеры.
+    """
+    help = 'find and merge near-duplicate ingredients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--threshold', default=0.9, type=float,
+            help='minimal Dice similarity of character n-grams'
+        )
+        parser.add_argument(
+            '--prefix', default=2, type=int,
+            help='compare only names starting with the same letters'
+        )
+        parser.add_argument('--ngram', default=3, type=int)
+        parser.add_argument(
+            '--batch-size', default=100, type=int,
+            help='clusters merged per transaction'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        clusters = find_clusters(
+            options['threshold'], options['prefix'], options['ngram']
+        )
+        for cluster in clusters:
+            canonical = cluster['canonical']
+            print(f'{canonical["raw"]} [{canonical["uses"]} рецептов]')
+            for duplicate in cluster['duplicates']:
+                factor = duplicate['factor'] // canonical['factor']
+                print(
+                    f'    <- {duplicate["raw"]} '
+                    f'[{duplicate["uses"]} рецептов, '
+                    f'сходство {duplicate["score"]:.2f}'
+                    + (f', ×{factor}' if factor != 1 else '') + ']'
+                )
+        duplicates = sum(len(cluster['duplicates']) for cluster in clusters)
+        print(
+            f'{len(clusters)} clusters, {duplicates} duplicates '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+        if options['dry_run'] or not clusters:
+            return
+        recipe_ids = merge_clusters(clusters, options['batch_size'])
+        bump_recipe_versions(Recipe.objects.filter(id__in=recipe_ids))
+        print(
+            f'merged, {len(recipe_ids)} recipes changed; '
+            'run build_similar_recipes to refresh similar recipes'
+        )
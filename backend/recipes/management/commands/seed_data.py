@@ -0,0 +1,294 @@
+import csv
+import io
+import itertools
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+
+from recipes.models import (FavouriteRecipes, Follow, Ingredient,
+                            IngredientsInRecipe, Recipe, ShoppingCart, Tag,
+                            TagsInRecipe)
+from users.models import User
+
+SEED_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F5C242', 'dessert'),
+    ('Выпечка', '#C9753D', 'bakery'),
+    ('Суп', '#3D8DC9', 'soup'),
+)
+
+# Данные, общие для всех порций; передаются в процессы один раз
+_context = {}
+
+
+def init_worker(context):
+    _context.update(context)
+    connections.close_all()
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса распределения Ципфа для random.choices."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+def pick_unique(rng, population, cum_weights, count, exclude=None):
+    picked = set(rng.choices(population, cum_weights=cum_weights, k=count))
+    picked.discard(exclude)
+    return picked
+
+
+def write_rows(model, fields, rows):
+    """Вставка строк через COPY для PostgreSQL или bulk_create."""
+    if not rows:
+        return 0
+    if connection.vendor == 'postgresql':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        columns = ', '.join(
+            model._meta.get_field(field).column for field in fields
+        )
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {model._meta.db_table} ({columns}) '
+                f'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+    else:
+        with transaction.atomic():
+            model.objects.bulk_create(
+                (model(**dict(zip(fields, row))) for row in rows),
+                batch_size=1000
+            )
+    return len(rows)
+
+
+def seed_users(start, end):
+    password = _context['password']
+    prefix = _context['prefix']
+    rows = [
+        (f'{prefix}{i}', f'{prefix}{i}@example.com', f'Имя{i}',
+         f'Фамилия{i}', password, 'user', False, False, True,
+         _context['now'])
+        for i in range(start, end)
+    ]
+    return write_rows(
+        User,
+        ('username', 'email', 'first_name', 'last_name', 'password', 'role',
+         'is_superuser', 'is_staff', 'is_active', 'date_joined'),
+        rows
+    )
+
+
+def seed_recipes(start, end):
+    rng = random.Random(_context['seed'] * 7919 + start)
+    users = _context['users']
+    rows = [
+        (
+            rng.choices(users, cum_weights=_context['user_weights'])[0],
+            f'Рецепт {i}',
+            f'Описание рецепта {i}. ' * rng.randint(1, 10),
+            rng.randint(1, 180),
+            '',
+            1,
+            False,
+        )
+        for i in range(start, end)
+    ]
+    # COPY не подставляет значения по умолчанию из модели,
+    # а у колонки в базе их нет
+    return write_rows(
+        Recipe,
+        ('author_id', 'name', 'text', 'cooking_time', 'image', 'version',
+         'is_deleted'),
+        rows
+    )
+
+
+def seed_recipe_relations(start, end):
+    rng = random.Random(_context['seed'] * 104729 + start)
+    ingredients = _context['ingredients']
+    tags = _context['tags']
+    per_recipe = _context['ingredients_per_recipe']
+    ingredient_rows = []
+    tag_rows = []
+    for recipe_id in _context['recipes'][start:end]:
+        for ingredient_id in pick_unique(
+                rng, ingredients, _context['ingredient_weights'],
+                rng.randint(max(1, per_recipe // 2), per_recipe * 3 // 2 + 1)
+        ):
+            ingredient_rows.append(
+                (recipe_id, ingredient_id, rng.randint(1, 1000))
+            )
+        for tag_id in rng.sample(tags, rng.randint(1, min(3, len(tags)))):
+            tag_rows.append((recipe_id, tag_id))
+    write_rows(
+        IngredientsInRecipe, ('recipe_id', 'ingredient_id', 'amount'),
+        ingredient_rows
+    )
+    write_rows(TagsInRecipe, ('recipe_id', 'tags_id'), tag_rows)
+    return len(ingredient_rows) + len(tag_rows)
+
+
+def seed_user_relations(start, end):
+    rng = random.Random(_context['seed'] * 1299709 + start)
+    users = _context['users']
+    recipes = _context['recipes']
+    follows = []
+    favourites = []
+    cart = []
+    for user_id in users[start:end]:
+        for following_id in pick_unique(
+                rng, users, _context['user_weights'],
+                rng.randint(0, _context['follows'] * 2), exclude=user_id
+        ):
+            follows.append((user_id, following_id))
+        for recipe_id in pick_unique(
+                rng, recipes, _context['recipe_weights'],
+                rng.randint(0, _context['favourites'] * 2)
+        ):
+            favourites.append((user_id, recipe_id))
+        for recipe_id in pick_unique(
+                rng, recipes, _context['recipe_weights'],
+                rng.randint(0, _context['cart'] * 2)
+        ):
+            cart.append((user_id, recipe_id))
+    write_rows(Follow, ('user_id', 'following_id'), follows)
+    write_rows(FavouriteRecipes, ('user_id', 'recipe_id'), favourites)
+    write_rows(ShoppingCart, ('user_id', 'recipe_id'), cart)
+    return len(follows) + len(favourites) + len(cart)
+
+
+class Command(BaseCommand):
+    """
+    Генерация большого воспроизводимого набора данных для нагрузочных
+    тестов: пользователи, подписки, теги, рецепты с ингредиентами,
+    избранное и корзины с распределением Ципфа по популярности.
+    """
+    help = 'seed the database with a large synthetic dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=1000, type=int)
+        parser.add_argument('--recipes', default=10000, type=int)
+        parser.add_argument(
+            '--ingredients', default=2000, type=int,
+            help='ingredients to create if the catalogue is empty'
+        )
+        parser.add_argument('--ingredients-per-recipe', default=8, type=int)
+        parser.add_argument('--follows', default=10, type=int,
+                            help='average follows per user')
+        parser.add_argument('--favourites', default=20, type=int,
+                            help='average favourites per user')
+        parser.add_argument('--cart', default=3, type=int,
+                            help='average cart recipes per user')
+        parser.add_argument('--zipf', default=1.1, type=float)
+        parser.add_argument('--seed', default=42, type=int)
+        parser.add_argument('--workers', default=1, type=int)
+        parser.add_argument('--chunk-size', default=10000, type=int)
+        parser.add_argument('--prefix', default='seed_user_')
+
+    def run_phase(self, name, func, total, chunk_size):
+        started = time.perf_counter()
+        chunks = [
+            (start, min(start + chunk_size, total))
+            for start in range(0, total, chunk_size)
+        ]
+        connections.close_all()
+        if not chunks:
+            rows = 0
+        elif self.workers > 1:
+            with ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=init_worker,
+                    initargs=(_context,)
+            ) as executor:
+                rows = sum(executor.map(func, *zip(*chunks)))
+        else:
+            rows = sum(func(start, end) for start, end in chunks)
+        elapsed = time.perf_counter() - started
+        print(f'{name}: {rows} rows in {elapsed:.1f}s '
+              f'({rows / max(elapsed, 1e-9):.0f} rows/s)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.workers = options['workers']
+        chunk_size = options['chunk_size']
+        exponent = options['zipf']
+
+        for name, color, slug in SEED_TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )
+        if not Ingredient.objects.exists():
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+                for i in range(options['ingredients'])
+            )
+
+        last_user = User.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        last_recipe = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        _context.update(
+            seed=options['seed'],
+            prefix=f'{options["prefix"]}{last_user}_',
+            password=make_password('password'),
+            now=time.strftime('%Y-%m-%d %H:%M:%S+00:00', time.gmtime()),
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+            follows=options['follows'],
+            favourites=options['favourites'],
+            cart=options['cart'],
+            tags=list(Tag.objects.values_list('id', flat=True)),
+            ingredients=list(
+                Ingredient.objects.order_by('id').values_list('id', flat=True)
+            ),
+        )
+        _context['ingredient_weights'] = zipf_weights(
+            len(_context['ingredients']), exponent
+        )
+
+        self.run_phase('users', seed_users, options['users'], chunk_size)
+        _context['users'] = list(
+            User.objects.filter(id__gt=last_user)
+            .order_by('id').values_list('id', flat=True)
+        )
+        _context['user_weights'] = zipf_weights(
+            len(_context['users']), exponent
+        )
+
+        self.run_phase(
+            'recipes', seed_recipes, options['recipes'], chunk_size
+        )
+        _context['recipes'] = list(
+            Recipe.objects.filter(id__gt=last_recipe)
+            .order_by('id').values_list('id', flat=True)
+        )
+        _context['recipe_weights'] = zipf_weights(
+            len(_context['recipes']), exponent
+        )
+
+        self.run_phase(
+            'recipe ingredients and tags', seed_recipe_relations,
+            len(_context['recipes']),
+            max(1, chunk_size // options['ingredients_per_recipe'])
+        )
+        self.run_phase(
+            'follows, favourites and carts', seed_user_relations,
+            len(_context['users']),
+            max(1, chunk_size // max(
+                1, options['follows'] + options['favourites']
+            ))
+        )
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        print(f'Done in {time.perf_counter() - started:.1f}s')
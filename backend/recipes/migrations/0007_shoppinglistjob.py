@@ -0,0 +1,49 @@
+# Generated by Django 4.0.10 on 2026-10-19 05:15
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0006_alter_shoppingcart_recipe_alter_shoppingcart_user'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingredientsinrecipe',
+            name='amount',
+            field=models.IntegerField(default=1, validators=[django.core.validators.MinValueValidator(1, message='Масса ингредиентов должна быть больше нуля')], verbose_name='Количество ингредиентов'),
+        ),
+        migrations.CreateModel(
+            name='ShoppingListJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart_hash', models.CharField(max_length=64, verbose_name='Хэш корзины')),
+                ('format', models.CharField(default='txt', max_length=10, verbose_name='Формат')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('content', models.BinaryField(blank=True, null=True, verbose_name='Файл')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Задача списка покупок',
+                'verbose_name_plural': 'Задачи списка покупок',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglistjob',
+            index=models.Index(fields=['user', 'cart_hash', 'format'], name='shopping_list_job_lookup'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglistjob',
+            index=models.Index(fields=['status'], name='shopping_list_job_status'),
+        ),
+    ]
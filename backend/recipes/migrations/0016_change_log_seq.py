@@ -0,0 +1,38 @@
+# Generated by Django 4.0.10 on 2026-10-19 06:21
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def number_existing(apps, schema_editor):
+    # Курсоры клиентов были id записей, номера продолжают их
+    ChangeLogEntry = apps.get_model('recipes', 'ChangeLogEntry')
+    ChangeLogEntry.objects.update(seq=F('id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_feed_pull_author'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='changelogentry',
+            name='change_log_user',
+        ),
+        migrations.AddField(
+            model_name='changelogentry',
+            name='seq',
+            field=models.BigIntegerField(editable=False, null=True, unique=True, verbose_name='Номер'),
+        ),
+        migrations.RunPython(number_existing, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['user', 'seq'], name='change_log_user_seq'),
+        ),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(condition=models.Q(('seq__isnull', True)), fields=['id'], name='change_log_unsequenced'),
+        ),
+    ]
@@ -17,7 +17,7 @@ class Tag(models.Model):
 
 
 class Ingredient(models.Model):
-    name = models.CharField('Название', max_length=100)
+    name = models.CharField('Название', max_length=100, db_index=True)
     measurement_unit = models.CharField(
         'Ед. измерения',
         default='Грамм',
@@ -32,6 +32,12 @@ class Ingredient(models.Model):
         return self.name[:30]
 
 
+class RecipeManager(models.Manager):
+    """Рецепты, помеченные на удаление, скрыты везде, кроме _base_manager."""
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -44,13 +50,19 @@ class Recipe(models.Model):
         through='TagsInRecipe',
         related_name='recipes'
     )
-    name = models.CharField(max_length=50)
+    name = models.CharField(max_length=50, db_index=True)
     image = models.ImageField(
         'Картинка',
         blank=True,
     )
     text = models.CharField('Текст', max_length=500)
     cooking_time = models.PositiveIntegerField('Время приготовления')
+    version = models.PositiveIntegerField('Версия', default=1, editable=False)
+    is_deleted = models.BooleanField(
+        'Удаляется', default=False, editable=False
+    )
+
+    objects = RecipeManager()
 
     class Meta:
         ordering = ['-id']
@@ -136,7 +148,7 @@ class ShoppingCart(models.Model):
         verbose_name_plural = 'Списки покупок'
 
     def __str__(self):
-        return f'{self.recipes} - {self.user}'
+        return f'{self.recipe} - {self.user}'
 
 
 class FavouriteRecipes(models.Model):
@@ -192,3 +204,294 @@ class Follow(models.Model):
                 check=~models.Q(user=models.F('following')),
                 name='do not selffollow'),
         ]
+
+
+class FeedEntry(models.Model):
+    """Запись ленты: новый рецепт автора, на которого подписан user."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(fields=('user', '-recipe'), name='feed_entry_page'),
+            models.Index(fields=('user', 'author'), name='feed_entry_author'),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+
+class FeedPullAuthor(models.Model):
+    """
+    Автор с числом подписчиков больше FEED['FANOUT_LIMIT']: его рецепты
+    не раскладываются по лентам, а читаются при запросе.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+'
+    )
+
+    class Meta:
+        verbose_name = 'Автор с лентой по запросу'
+        verbose_name_plural = 'Авторы с лентой по запросу'
+
+
+class AuthorSuggestion(models.Model):
+    """Заранее посчитанная рекомендация автора пользователю."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='author_suggestions',
+        verbose_name='Пользователь'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_author_suggestion'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-score'), name='author_suggestion_top'
+            ),
+        ]
+        verbose_name = 'Рекомендация автора'
+        verbose_name_plural = 'Рекомендации авторов'
+
+
+class SuggestionRefresh(models.Model):
+    """Пользователи, чьи подписки изменились после расчёта рекомендаций."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+'
+    )
+
+    class Meta:
+        verbose_name = 'Обновление рекомендаций'
+        verbose_name_plural = 'Обновления рекомендаций'
+
+
+class ShoppingListJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_jobs',
+        verbose_name='Пользователь'
+    )
+    cart_hash = models.CharField('Хэш корзины', max_length=64)
+    format = models.CharField('Формат', max_length=10, default='txt')
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    content = models.BinaryField('Файл', null=True, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    finished = models.DateTimeField('Завершено', null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=('user', 'cart_hash', 'format'),
+                name='shopping_list_job_lookup'
+            ),
+            models.Index(fields=('status',), name='shopping_list_job_status'),
+        ]
+        verbose_name = 'Задача списка покупок'
+        verbose_name_plural = 'Задачи списка покупок'
+
+    def __str__(self) -> str:
+        return f'{self.user_id}: {self.format} ({self.status})'
+
+
+class RecipeSignature(models.Model):
+    """MinHash-сигнатура множества ингредиентов рецепта."""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature'
+    )
+    signature = models.BinaryField('Сигнатура')
+
+    class Meta:
+        verbose_name = 'Сигнатура рецепта'
+        verbose_name_plural = 'Сигнатуры рецептов'
+
+
+class RecipeBand(models.Model):
+    """Корзина LSH: хэш одной полосы сигнатуры рецепта."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='bands'
+    )
+    band = models.PositiveSmallIntegerField('Полоса')
+    bucket = models.BigIntegerField('Корзина')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=('band', 'bucket'), name='recipe_band_bucket'
+            ),
+        ]
+        verbose_name = 'Полоса сигнатуры'
+        verbose_name_plural = 'Полосы сигнатур'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to'
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('recipe', '-score'), name='similar_recipe_top'
+            ),
+        ]
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id} ~ {self.similar_id}: {self.score:.2f}'
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Изменение, которое клиент забирает через /api/sync/. user пуст
+    у изменений рецептов, видимых всем. Без ограничения внешнего ключа:
+    записи об удалении связей пишутся и при удалении самого
+    пользователя, а уходят при сжатии журнала. seq — номер в порядке
+    фиксации транзакций, его проставляет api.sync.sequence().
+    """
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    FOLLOW = 'follow'
+    KIND_CHOICES = (
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+        (FOLLOW, 'Подписка'),
+    )
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    OP_CHOICES = (
+        (CREATE, 'Добавление'),
+        (UPDATE, 'Изменение'),
+        (DELETE, 'Удаление'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+        verbose_name='Пользователь'
+    )
+    kind = models.CharField('Объект', max_length=16, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField('id объекта')
+    op = models.CharField('Операция', max_length=6, choices=OP_CHOICES)
+    seq = models.BigIntegerField(
+        'Номер', null=True, unique=True, editable=False
+    )
+    created = models.DateTimeField('Создано', auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=('user', 'seq'), name='change_log_user_seq'),
+            models.Index(fields=('created',), name='change_log_created'),
+            models.Index(
+                fields=('id',),
+                condition=models.Q(seq__isnull=True),
+                name='change_log_unsequenced'
+            ),
+        ]
+        verbose_name = 'Запись журнала изменений'
+        verbose_name_plural = 'Журнал изменений'
+
+    def __str__(self) -> str:
+        return f'{self.id}: {self.op} {self.kind} {self.object_id}'
+
+
+class ChangeLogHorizon(models.Model):
+    """
+    Граница сжатия журнала: записи с seq не больше horizon удалены,
+    клиентам с более старым курсором нужна полная синхронизация.
+    """
+    horizon = models.BigIntegerField('Граница')
+    created = models.DateTimeField('Создано', auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Граница журнала изменений'
+        verbose_name_plural = 'Границы журнала изменений'
@@ -0,0 +1,298 @@
+"""
+Похожие рецепты по множествам ингредиентов: MinHash-сигнатуры,
+LSH-корзины по полосам сигнатуры и заранее посчитанные top-k соседей.
+Сходство — оценка коэффициента Жаккара долей совпавших минимумов.
+"""
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial, reduce
+from operator import or_
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from api.slow_queries import recording
+from .models import (IngredientsInRecipe, RecipeBand, RecipeSignature,
+                     SimilarRecipe)
+
+PRIME = (1 << 31) - 1
+SEED = 1299709
+BAND_MULTIPLIER = np.uint64(0x100000001B3)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_SIMILARITY['WORKERS'],
+            thread_name_prefix='recipe-similarity'
+        )
+    return _executor
+
+
+@lru_cache(maxsize=None)
+def get_permutations():
+    """Коэффициенты хэш-функций (a * x + b) mod PRIME, одинаковые везде."""
+    rng = np.random.default_rng(SEED)
+    size = settings.RECIPE_SIMILARITY['NUM_PERM']
+    return (
+        rng.integers(1, PRIME, size, dtype=np.uint64),
+        rng.integers(0, PRIME, size, dtype=np.uint64),
+    )
+
+
+def minhash(pairs):
+    """
+    pairs — массив (recipe_id, ingredient_id), отсортированный по рецепту.
+    Возвращает id рецептов и их сигнатуры, матрицу (рецепты, NUM_PERM).
+    """
+    a, b = get_permutations()
+    recipe_ids, starts = np.unique(pairs[:, 0], return_index=True)
+    hashes = (pairs[:, 1].astype(np.uint64)[:, None] * a + b) % PRIME
+    return recipe_ids, np.minimum.reduceat(
+        hashes, starts, axis=0
+    ).astype(np.uint32)
+
+
+def band_buckets(signatures):
+    """Хэш каждой полосы сигнатуры, матрица (рецепты, BANDS) int64."""
+    rows = signatures.reshape(
+        len(signatures), settings.RECIPE_SIMILARITY['BANDS'], -1
+    ).astype(np.uint64)
+    weights = BAND_MULTIPLIER ** np.arange(rows.shape[2], dtype=np.uint64)
+    return (rows * weights).sum(axis=2, dtype=np.uint64).view(np.int64)
+
+
+def scores(left, right):
+    return (left == right).mean(axis=-1)
+
+
+def load_pairs(queryset):
+    pairs = np.fromiter(
+        itertools.chain.from_iterable(
+            queryset.order_by('recipe_id', 'ingredient_id')
+            .values_list('recipe_id', 'ingredient_id')
+            .iterator(chunk_size=10000)
+        ),
+        dtype=np.int64
+    )
+    return pairs.reshape(-1, 2)
+
+
+def candidate_pairs(buckets):
+    """Пары индексов рецептов, совпавших хотя бы в одной полосе."""
+    max_bucket = settings.RECIPE_SIMILARITY['MAX_BUCKET']
+    found = []
+    for band in range(buckets.shape[1]):
+        order = np.argsort(buckets[:, band], kind='stable')
+        values = buckets[order, band]
+        starts = np.r_[0, np.flatnonzero(np.diff(values)) + 1]
+        lengths = np.diff(np.r_[starts, len(values)])
+        shared = lengths > 1
+        for start, length in zip(starts[shared], lengths[shared]):
+            # Огромные корзины (популярные наборы) обрезаются
+            group = order[start:start + min(length, max_bucket)]
+            left, right = np.triu_indices(len(group), k=1)
+            found.append(np.stack((group[left], group[right]), axis=1))
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.concatenate(found)
+    pairs.sort(axis=1)
+    return np.unique(pairs, axis=0)
+
+
+def top_neighbours(sources, targets, values):
+    """Оставляет для каждого источника TOP_K лучших соседей."""
+    config = settings.RECIPE_SIMILARITY
+    keep = values >= config['MIN_SCORE']
+    sources, targets, values = sources[keep], targets[keep], values[keep]
+    order = np.lexsort((-values, sources))
+    sources, targets, values = sources[order], targets[order], values[order]
+    starts = np.flatnonzero(np.r_[True, np.diff(sources) != 0])
+    ranks = np.arange(len(sources)) - np.repeat(
+        starts, np.diff(np.r_[starts, len(sources)])
+    )
+    keep = ranks < config['TOP_K']
+    return sources[keep], targets[keep], values[keep]
+
+
+def build_all(chunk_size=2000):
+    """Полный пересчёт сигнатур, корзин и соседей всех рецептов."""
+    pairs = load_pairs(IngredientsInRecipe.objects.all())
+    recipe_starts = (
+        np.flatnonzero(np.r_[True, np.diff(pairs[:, 0]) != 0])
+        if len(pairs) else np.empty(0, dtype=np.int64)
+    )
+    recipe_ids = []
+    signatures = []
+    for start in range(0, len(recipe_starts), chunk_size):
+        first = recipe_starts[start]
+        last = (
+            recipe_starts[start + chunk_size]
+            if start + chunk_size < len(recipe_starts) else len(pairs)
+        )
+        ids, chunk = minhash(pairs[first:last])
+        recipe_ids.append(ids)
+        signatures.append(chunk)
+    if not recipe_ids:
+        recipe_ids = np.empty(0, dtype=np.int64)
+        signatures = np.empty(
+            (0, settings.RECIPE_SIMILARITY['NUM_PERM']), dtype=np.uint32
+        )
+    else:
+        recipe_ids = np.concatenate(recipe_ids)
+        signatures = np.concatenate(signatures)
+    buckets = band_buckets(signatures)
+
+    candidates = candidate_pairs(buckets)
+    values = np.concatenate([
+        scores(signatures[chunk[:, 0]], signatures[chunk[:, 1]])
+        for chunk in np.array_split(
+            candidates, max(1, len(candidates) // 100000)
+        )
+    ]) if len(candidates) else np.empty(0)
+    sources, targets, values = top_neighbours(
+        np.r_[candidates[:, 0], candidates[:, 1]],
+        np.r_[candidates[:, 1], candidates[:, 0]],
+        np.r_[values, values]
+    )
+
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        RecipeBand.objects.all().delete()
+        RecipeSignature.objects.all().delete()
+        RecipeSignature.objects.bulk_create(
+            (RecipeSignature(recipe_id=int(recipe_id),
+                             signature=signature.tobytes())
+             for recipe_id, signature in zip(recipe_ids, signatures)),
+            batch_size=5000
+        )
+        RecipeBand.objects.bulk_create(
+            (RecipeBand(recipe_id=int(recipe_id), band=band,
+                        bucket=int(bucket))
+             for recipe_id, row in zip(recipe_ids, buckets)
+             for band, bucket in enumerate(row)),
+            batch_size=5000
+        )
+        SimilarRecipe.objects.bulk_create(
+            (SimilarRecipe(recipe_id=int(recipe_ids[source]),
+                           similar_id=int(recipe_ids[target]),
+                           score=float(value))
+             for source, target, value in zip(sources, targets, values)),
+            batch_size=5000
+        )
+    return len(recipe_ids), len(sources)
+
+
+def update_recipe(recipe_id):
+    """
+    Пересчёт после изменения ингредиентов одного рецепта: кандидаты
+    берутся из его LSH-корзин, соседи дополняют свои списки, если рецепт
+    в них проходит. Выбывшие из чужих списков места заполнит следующий
+    полный пересчёт.
+    """
+    config = settings.RECIPE_SIMILARITY
+    pairs = load_pairs(IngredientsInRecipe.objects.filter(recipe_id=recipe_id))
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(
+            Q(recipe_id=recipe_id) | Q(similar_id=recipe_id)
+        ).delete()
+        RecipeBand.objects.filter(recipe_id=recipe_id).delete()
+        if not len(pairs):
+            RecipeSignature.objects.filter(recipe_id=recipe_id).delete()
+            return
+
+        _, signature = minhash(pairs)
+        signature = signature[0]
+        buckets = band_buckets(signature[None, :])[0]
+        RecipeSignature.objects.update_or_create(
+            recipe_id=recipe_id,
+            defaults={'signature': signature.tobytes()}
+        )
+        RecipeBand.objects.bulk_create(
+            RecipeBand(recipe_id=recipe_id, band=band, bucket=int(bucket))
+            for band, bucket in enumerate(buckets)
+        )
+
+        candidates = RecipeBand.objects.filter(reduce(or_, (
+            Q(band=band, bucket=int(bucket))
+            for band, bucket in enumerate(buckets)
+        ))).exclude(recipe_id=recipe_id).values_list(
+            'recipe_id', flat=True
+        ).distinct()
+        loaded = list(RecipeSignature.objects.filter(
+            recipe_id__in=candidates
+        ).values_list('recipe_id', 'signature'))
+        if not loaded:
+            return
+        candidate_ids = np.array([row[0] for row in loaded])
+        values = scores(
+            np.stack([
+                np.frombuffer(row[1], dtype=np.uint32) for row in loaded
+            ]),
+            signature
+        )
+        order = np.argsort(-values, kind='stable')
+        order = order[values[order] >= config['MIN_SCORE']]
+        new_rows = [
+            SimilarRecipe(recipe_id=recipe_id,
+                          similar_id=int(candidate_ids[i]),
+                          score=float(values[i]))
+            for i in order[:config['TOP_K']]
+        ]
+
+        # Рецепт попадает в списки соседей, если вытесняет худшего
+        neighbour_scores = dict(zip(candidate_ids[order], values[order]))
+        current = {}
+        for row in SimilarRecipe.objects.filter(
+                recipe_id__in=neighbour_scores
+        ).values('id', 'recipe_id', 'score'):
+            current.setdefault(row['recipe_id'], []).append(row)
+        evicted = []
+        for neighbour_id, score in neighbour_scores.items():
+            rows = sorted(
+                current.get(neighbour_id, ()), key=lambda row: row['score']
+            )
+            if len(rows) >= config['TOP_K']:
+                if rows[0]['score'] >= score:
+                    continue
+                evicted.append(rows[0]['id'])
+            new_rows.append(SimilarRecipe(
+                recipe_id=int(neighbour_id), similar_id=recipe_id,
+                score=float(score)
+            ))
+        SimilarRecipe.objects.filter(id__in=evicted).delete()
+        # параллельный пересчёт соседнего рецепта мог уже добавить пару
+        SimilarRecipe.objects.bulk_create(new_rows, ignore_conflicts=True)
+
+
+def update_recipes(recipe_ids):
+    for recipe_id in recipe_ids:
+        update_recipe(recipe_id)
+
+
+def _run_updates(recipe_ids):
+    close_old_connections()
+    try:
+        with recording('similarity.update_recipes'):
+            update_recipes(recipe_ids)
+    finally:
+        close_old_connections()
+
+
+def schedule_update(recipe_ids):
+    """
+    Пересчёт похожих рецептов в фоне после фиксации транзакции, чтобы
+    MinHash не добавлялся к времени сохранения. При WORKERS=0 —
+    сразу после фиксации в том же потоке.
+    """
+    recipe_ids = list(recipe_ids)
+    if settings.RECIPE_SIMILARITY['WORKERS']:
+        task = partial(_run_updates, recipe_ids)
+        transaction.on_commit(lambda: get_executor().submit(task))
+    else:
+        transaction.on_commit(partial(update_recipes, recipe_ids))
@@ -0,0 +1,56 @@
+from django.test import TestCase
+
+from users.models import User
+from .dedup import find_clusters, merge_clusters
+from .models import Ingredient, IngredientsInRecipe, Recipe
+
+
+class MergeDuplicateIngredientsTest(TestCase):
+
+    def setUp(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pw'
+        )
+        self.grams = Ingredient.objects.create(
+            name='Мука пшеничная', measurement_unit='г'
+        )
+        self.kilograms = Ingredient.objects.create(
+            name='мука  пшеничная', measurement_unit='кг'
+        )
+        self.recipe = Recipe.objects.create(
+            author=author, name='Блины', text='text', cooking_time=10
+        )
+        self.shared = Recipe.objects.create(
+            author=author, name='Оладьи', text='text', cooking_time=10
+        )
+        IngredientsInRecipe.objects.create(
+            recipe=self.recipe, ingredient=self.kilograms, amount=2
+        )
+        IngredientsInRecipe.objects.create(
+            recipe=self.shared, ingredient=self.grams, amount=300
+        )
+        IngredientsInRecipe.objects.create(
+            recipe=self.shared, ingredient=self.kilograms, amount=1
+        )
+
+    def test_pair_is_one_cluster(self):
+        clusters = find_clusters()
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]['canonical']['id'], self.grams.id)
+        self.assertEqual(
+            [item['id'] for item in clusters[0]['duplicates']],
+            [self.kilograms.id]
+        )
+
+    def test_merge_scales_amounts(self):
+        recipe_ids = merge_clusters(find_clusters())
+        self.assertEqual(recipe_ids, {self.recipe.id, self.shared.id})
+        self.assertFalse(
+            Ingredient.objects.filter(id=self.kilograms.id).exists()
+        )
+        self.assertEqual(
+            dict(IngredientsInRecipe.objects.values_list(
+                'recipe_id', 'amount'
+            ).filter(ingredient=self.grams)),
+            {self.recipe.id: 2000, self.shared.id: 1300}
+        )
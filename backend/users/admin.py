@@ -1,5 +1,11 @@
 from django.contrib import admin
 
+from api.deletion import ScheduledDeletionAdminMixin
 from .models import User
 
-admin.site.register(User)
+
+@admin.register(User)
+class UserAdmin(ScheduledDeletionAdminMixin, admin.ModelAdmin):
+    list_display = ('username', 'email', 'first_name', 'last_name',)
+    search_fields = ('username__startswith', 'email__startswith',)
+    ordering = ('id',)
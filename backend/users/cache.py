@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api import identity
+from recipes.models import Follow
+from users.models import User
+
+PROFILE_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name')
+
+
+class LocalLRUCache:
+    """Небольшой LRU-кэш процесса с ограниченным временем жизни записей."""
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + self.ttl)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+local_profiles = LocalLRUCache(
+    settings.USER_PROFILE_CACHE['LOCAL_SIZE'],
+    settings.USER_PROFILE_CACHE['LOCAL_TTL'],
+)
+
+
+def profile_key(user_id):
+    return f'user-profile:{user_id}'
+
+
+def following_key(user_id):
+    return f'user-following:{user_id}'
+
+
+def profile_from_user(user):
+    return {field: getattr(user, field) for field in PROFILE_FIELDS}
+
+
+def get_profiles(user_ids):
+    """
+    Публичные данные пользователей: сначала LRU процесса, затем общий кэш
+    одним get_many, оставшиеся одним запросом к БД.
+    """
+    profiles = {}
+    missing = []
+    for user_id in user_ids:
+        profile = local_profiles.get(user_id)
+        if profile is None:
+            missing.append(user_id)
+        else:
+            profiles[user_id] = profile
+    if not missing:
+        return profiles
+
+    cached = cache.get_many([profile_key(user_id) for user_id in missing])
+    still_missing = []
+    for user_id in missing:
+        profile = cached.get(profile_key(user_id))
+        if profile is None:
+            still_missing.append(user_id)
+        else:
+            local_profiles.set(user_id, profile)
+            profiles[user_id] = profile
+    if not still_missing:
+        return profiles
+
+    loaded = {
+        profile['id']: profile
+        for profile in User.objects.filter(
+            pk__in=still_missing
+        ).values(*PROFILE_FIELDS)
+    }
+    cache.set_many(
+        {profile_key(user_id): profile for user_id, profile in loaded.items()},
+        settings.USER_PROFILE_CACHE['TIMEOUT']
+    )
+    for user_id, profile in loaded.items():
+        local_profiles.set(user_id, profile)
+    profiles.update(loaded)
+    return profiles
+
+
+def get_profile(user_id):
+    return get_profiles([user_id]).get(user_id)
+
+
+def get_following(request):
+    """
+    Множество id авторов, на которых подписан пользователь запроса.
+    Загружается один раз за запрос или до изменения подписок.
+    """
+    user = request.user
+    if user.is_anonymous:
+        return frozenset()
+    return identity.memoize(
+        ('following', user.pk), (Follow,), lambda: load_following(user.pk)
+    )
+
+
+def load_following(user_id):
+    following = cache.get(following_key(user_id))
+    if following is None:
+        following = frozenset(
+            Follow.objects.filter(user_id=user_id)
+            .values_list('following_id', flat=True)
+        )
+        cache.set(
+            following_key(user_id), following,
+            settings.USER_PROFILE_CACHE['TIMEOUT']
+        )
+    return following
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_profile(sender, instance, **kwargs):
+    # LRU других процессов не очищается: там старые имя и email
+    # видны ещё до USER_PROFILE_CACHE['LOCAL_TTL'] секунд
+    cache.delete(profile_key(instance.pk))
+    local_profiles.delete(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_following(sender, instance, **kwargs):
+    cache.delete(following_key(instance.user_id))
@@ -0,0 +1,188 @@
+"""
+Лента новых рецептов авторов, на которых подписан пользователь.
+Новый рецепт в фоне раскладывается по таблицам-«входящим» подписчиков
+(fan-out on write). Рецепты авторов с очень большим числом подписчиков
+не раскладываются, а подмешиваются при чтении (pull). Список таких
+авторов (FeedPullAuthor) периодически пересчитывает команда
+refresh_feed_pull_authors.
+"""
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.slow_queries import recording
+from recipes.models import FeedEntry, FeedPullAuthor, Follow, Recipe
+
+PULL_AUTHORS_KEY = 'feed:pull-authors'
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.FEED['WORKERS'],
+            thread_name_prefix='feed-fanout'
+        )
+    return _executor
+
+
+def get_pull_authors():
+    """Авторы, чьи рецепты читаются при запросе ленты; из кэша."""
+    authors = cache.get(PULL_AUTHORS_KEY)
+    if authors is None:
+        authors = frozenset(
+            FeedPullAuthor.objects.values_list('author_id', flat=True)
+        )
+        cache.set(
+            PULL_AUTHORS_KEY, authors, settings.FEED['PULL_AUTHORS_TIMEOUT']
+        )
+    return authors
+
+
+def is_pull_author(author_id):
+    # Запись во входящие сверяется с базой: кэш в другом процессе
+    # может ещё помнить старый режим автора
+    return FeedPullAuthor.objects.filter(author_id=author_id).exists()
+
+
+def fan_out(recipe_ids, author_id):
+    """Записывает рецепты во входящие всех подписчиков автора."""
+    if is_pull_author(author_id):
+        return
+    followers = Follow.objects.filter(
+        following_id=author_id
+    ).values_list('user_id', flat=True).iterator(chunk_size=5000)
+    while True:
+        batch = list(itertools.islice(followers, 5000))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                       author_id=author_id)
+             for user_id in batch for recipe_id in recipe_ids),
+            ignore_conflicts=True
+        )
+
+
+def _run_fan_out(recipe_ids, author_id):
+    close_old_connections()
+    try:
+        with recording('feed.fan_out'):
+            fan_out(recipe_ids, author_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_fan_out(recipes):
+    """
+    Раскладка новых рецептов [(id, id автора)] после фиксации
+    транзакции, одна задача на автора.
+    """
+    by_author = {}
+    for recipe_id, author_id in recipes:
+        by_author.setdefault(author_id, []).append(recipe_id)
+    for author_id, recipe_ids in by_author.items():
+        if settings.FEED['WORKERS']:
+            task = partial(_run_fan_out, recipe_ids, author_id)
+            transaction.on_commit(
+                lambda task=task: get_executor().submit(task)
+            )
+        else:
+            transaction.on_commit(partial(fan_out, recipe_ids, author_id))
+
+
+def recent_recipes(author_id):
+    return list(Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-id').values_list('id', flat=True)[:settings.FEED['BACKFILL']])
+
+
+def backfill(user_id, author_id):
+    """Последние рецепты автора в ленту нового подписчика."""
+    if is_pull_author(author_id):
+        return
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+         for recipe_id in recent_recipes(author_id)),
+        ignore_conflicts=True
+    )
+
+
+def refresh_pull_authors():
+    """
+    Пересчёт авторов с лентой по запросу. Авторы, которые опустились
+    до FANOUT_LIMIT подписчиков, сначала возвращаются к раскладке,
+    затем их последние рецепты раскладываются по всем подписчикам,
+    иначе они пропали бы из лент. Возвращает (добавлено, убрано).
+    """
+    current = set(
+        Follow.objects.values('following')
+        .annotate(followers=Count('id'))
+        .filter(followers__gt=settings.FEED['FANOUT_LIMIT'])
+        .values_list('following', flat=True)
+    )
+    stored = set(FeedPullAuthor.objects.values_list('author_id', flat=True))
+    added = current - stored
+    removed = stored - current
+    FeedPullAuthor.objects.bulk_create(
+        (FeedPullAuthor(author_id=author_id) for author_id in added),
+        ignore_conflicts=True
+    )
+    FeedPullAuthor.objects.filter(author_id__in=removed).delete()
+    cache.delete(PULL_AUTHORS_KEY)
+    for author_id in removed:
+        fan_out(recent_recipes(author_id), author_id)
+    return len(added), len(removed)
+
+
+def get_feed_ids(user, following, before=None, limit=10):
+    """
+    id рецептов страницы ленты по убыванию: входящие пользователя
+    и рецепты pull-авторов, на которых он подписан, оба источника —
+    индексный просмотр с id < before.
+    """
+    entries = FeedEntry.objects.filter(user=user)
+    if before is not None:
+        entries = entries.filter(recipe_id__lt=before)
+    recipe_ids = set(
+        entries.order_by('-recipe_id').values_list(
+            'recipe_id', flat=True
+        )[:limit]
+    )
+    pull_authors = following & get_pull_authors()
+    if pull_authors:
+        pulled = Recipe.objects.filter(author_id__in=pull_authors)
+        if before is not None:
+            pulled = pulled.filter(id__lt=before)
+        recipe_ids.update(
+            pulled.order_by('-id').values_list('id', flat=True)[:limit]
+        )
+    return sorted(recipe_ids, reverse=True)[:limit]
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created, **kwargs):
+    if created:
+        schedule_fan_out([(instance.pk, instance.author_id)])
+
+
+@receiver(post_save, sender=Follow)
+def backfill_on_follow(sender, instance, created, **kwargs):
+    if created:
+        backfill(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_on_unfollow(sender, instance, **kwargs):
+    FeedEntry.objects.filter(
+        user_id=instance.user_id, author_id=instance.following_id
+    ).delete()
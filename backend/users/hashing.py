@@ -0,0 +1,97 @@
+"""
+Хеширование паролей в отдельном ограниченном пуле потоков.
+PBKDF2, bcrypt и argon2 отпускают GIL, поэтому пул из нескольких
+потоков ограничивает долю CPU, которую могут занять входы в систему,
+а переполненная очередь отклоняется сразу, не занимая воркер.
+Ограничение действует внутри процесса, поэтому gunicorn запускается
+с потоковыми воркерами (gunicorn.conf.py): в синхронном воркере
+запрос один и пул ничего бы не ограничивал.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен, повторите попытку позже.'
+    default_code = 'hashing_unavailable'
+
+    def __init__(self, detail=None, code=None, wait=None):
+        super().__init__(detail, code)
+        # exception_handler DRF добавит заголовок Retry-After
+        self.wait = wait
+
+
+class HashingExecutor:
+    def __init__(self, workers, queue_size, timeout):
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='password-hashing'
+        )
+        # Выполняемые и ожидающие задачи вместе
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingUnavailable(wait=1)
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HashingUnavailable(wait=int(self.timeout) + 1)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = HashingExecutor(**{
+                key.lower(): value
+                for key, value in settings.PASSWORD_HASHING.items()
+            })
+    return _executor
+
+
+def _check(password, encoded):
+    upgrade = []
+    valid = hashers.check_password(password, encoded, setter=upgrade.append)
+    return valid, bool(upgrade)
+
+
+def make_password(password):
+    return get_executor().run(hashers.make_password, password)
+
+
+def check_password(user, password):
+    """
+    Проверка пароля пользователя в пуле. Если хеш устарел (сменился
+    алгоритм или число итераций), он пересчитывается и сохраняется.
+    """
+    valid, must_update = get_executor().run(_check, password, user.password)
+    if valid and must_update:
+        user.password = make_password(password)
+        user.save(update_fields=['password'])
+    return valid
+
+
+def set_password(user, password):
+    """Как AbstractBaseUser.set_password, но хеш считается в пуле."""
+    user.password = make_password(password)
+    # По нему save() вызовет password_changed() валидаторов
+    user._password = password
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Follow
+from users.feed import backfill
+
+
+class Command(BaseCommand):
+    """
+    Заполняет ленты по существующим подпискам, например после первого
+    развёртывания ленты. Повторный запуск ничего не дублирует.
+    """
+    help = 'backfill feed inboxes from existing follows'
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.values_list(
+            'user_id', 'following_id'
+        ).order_by('id')
+        for count, (user_id, author_id) in enumerate(
+                follows.iterator(chunk_size=2000), start=1
+        ):
+            backfill(user_id, author_id)
+            if count % 10000 == 0:
+                print(f'{count} follows processed')
+        print('Done')
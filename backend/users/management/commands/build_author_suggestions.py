@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.suggestions import build, refresh_stale
+
+
+class Command(BaseCommand):
+    """
+    Пересчёт рекомендаций авторов по графу подписок и избранному.
+    С --stale обновляются только пользователи, чьи подписки изменились.
+    """
+    help = 'rebuild author suggestions from the follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale',
+            action='store_true',
+            help='refresh only users whose follows changed'
+        )
+        parser.add_argument('--batch-size', default=1000, type=int)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['stale']:
+            users = refresh_stale(options['batch_size'])
+        else:
+            users = build(batch_size=options['batch_size'])
+        print(f'{users} users in {time.perf_counter() - started:.1f}s')
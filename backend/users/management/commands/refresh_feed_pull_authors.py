@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from users.feed import refresh_pull_authors
+
+
+class Command(BaseCommand):
+    """
+    Пересчёт авторов, чьи рецепты читаются в ленту при запросе.
+    Запускается по расписанию, например раз в несколько минут.
+    """
+    help = 'recompute feed authors served by pull instead of fan-out'
+
+    def handle(self, *args, **options):
+        added, removed = refresh_pull_authors()
+        print(f'{added} authors switched to pull, {removed} to fan-out')
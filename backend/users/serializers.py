@@ -1,13 +1,14 @@
-from django.contrib.auth.hashers import make_password
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
-from recipes.models import Follow
+from api.mixins import SparseFieldsMixin
+from users.cache import get_following, get_profile, profile_from_user
+from users.hashing import make_password
 from users.models import User
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(SparseFieldsMixin, UserSerializer):
     username = serializers.SlugField(
         required=True,
         validators=[UniqueValidator(queryset=User.objects.all())],
@@ -20,10 +21,34 @@ class CustomUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
-        request_user = self.context.get('request').user
-        if request_user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=request_user, following=obj).exists()
+        request = self.context.get('request')
+        return obj.pk in get_following(request)
+
+    def to_representation(self, instance):
+        """
+        Принимает пользователя или его id (например, source='author_id'):
+        публичные поля берутся из кэша профилей, is_subscribed — из
+        загруженного один раз за запрос множества подписок. Для id
+        удалённого пользователя возвращает None, как пустая связь.
+        """
+        if isinstance(instance, User):
+            user_id = instance.pk
+            profile = profile_from_user(instance)
+        else:
+            user_id = instance
+            profile = get_profile(user_id)
+            if profile is None:
+                return None
+        representation = {}
+        for field in self._readable_fields:
+            if field.field_name == 'is_subscribed':
+                request = self.context.get('request')
+                representation['is_subscribed'] = (
+                    user_id in get_following(request)
+                )
+            else:
+                representation[field.field_name] = profile[field.field_name]
+        return representation
 
     def validate(self, data):
         if 'password' in data:
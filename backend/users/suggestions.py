@@ -0,0 +1,211 @@
+"""
+Рекомендации авторов по графу подписок. Граф загружается в CSR
+(массивы indptr/indices, индекс строки — id пользователя), оценки
+считаются пакетно и сохраняются как top-N для каждого пользователя:
+
+- авторы, на которых подписаны мои подписки (два шага по графу);
+- авторы, чьи рецепты я добавлял в избранное;
+- авторы, которых любят пользователи с теми же избранными рецептами.
+"""
+import itertools
+from functools import partial
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import (AuthorSuggestion, FavouriteRecipes, Follow,
+                            SuggestionRefresh)
+from users.models import User
+
+
+class CSR:
+    """
+    Разреженная матрица смежности: соседи строки i —
+    indices[indptr[i]:indptr[i + 1]].
+    """
+    def __init__(self, rows, columns, size):
+        order = np.argsort(rows, kind='stable')
+        self.indices = columns[order]
+        self.indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=size), out=self.indptr[1:])
+
+    def row(self, row):
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def gather(self, rows):
+        """Соседи всех строк rows одним массивом (с повторами)."""
+        rows = rows[rows < len(self.indptr) - 1]
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        if not lengths.sum():
+            return np.empty(0, dtype=self.indices.dtype)
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self.indices[offsets + np.arange(lengths.sum())]
+
+
+def load_edges(queryset, *fields):
+    edges = np.fromiter(
+        itertools.chain.from_iterable(
+            queryset.values_list(*fields).iterator(chunk_size=10000)
+        ),
+        dtype=np.int64
+    )
+    return edges.reshape(-1, 2)
+
+
+class FollowGraph:
+    """
+    Граф подписок и избранного. С user_ids загружается только то, что
+    нужно для их рекомендаций: их подписки и подписки этих авторов,
+    их избранное, поклонники тех же рецептов и избранное поклонников.
+    """
+    def __init__(self, user_ids=None):
+        follows = Follow.objects.all()
+        favourites = FavouriteRecipes.objects.all()
+        fan_favourites = FavouriteRecipes.objects.all()
+        if user_ids is not None:
+            follows = follows.filter(
+                Q(user_id__in=user_ids)
+                | Q(user_id__in=Follow.objects.filter(
+                    user_id__in=user_ids
+                ).values('following_id'))
+            )
+            favourites = favourites.filter(
+                recipe_id__in=FavouriteRecipes.objects.filter(
+                    user_id__in=user_ids
+                ).values('recipe_id')
+            )
+            fan_favourites = fan_favourites.filter(
+                user_id__in=favourites.values('user_id')
+            )
+        follows = load_edges(follows, 'user_id', 'following_id')
+        favourite_authors = load_edges(
+            fan_favourites, 'user_id', 'recipe__author_id'
+        )
+        favourites = load_edges(favourites, 'user_id', 'recipe_id')
+        size = max(
+            [int(edges[:, 0].max()) + 1
+             for edges in (follows, favourites, favourite_authors)
+             if len(edges)],
+            default=0
+        )
+        recipes = int(favourites[:, 1].max() + 1) if len(favourites) else 0
+        self.size = size
+        self.follows = CSR(follows[:, 0], follows[:, 1], size)
+        self.favourites = CSR(favourites[:, 0], favourites[:, 1], size)
+        self.fans = CSR(favourites[:, 1], favourites[:, 0], recipes)
+        self.favourite_authors = CSR(
+            favourite_authors[:, 0], favourite_authors[:, 1], size
+        )
+
+    def users(self):
+        """Пользователи, для которых есть хоть какой-то сигнал."""
+        return np.flatnonzero(
+            np.diff(self.follows.indptr) + np.diff(self.favourites.indptr)
+        )
+
+    def suggest(self, user_id):
+        config = settings.AUTHOR_SUGGESTIONS
+        if user_id >= self.size:
+            return []
+        scores = {}
+
+        def add(authors, weight):
+            values, counts = np.unique(authors, return_counts=True)
+            for author, count in zip(values.tolist(), counts.tolist()):
+                scores[author] = scores.get(author, 0) + weight * count
+
+        following = self.follows.row(user_id)
+        add(self.follows.gather(following), 1)
+        add(self.favourite_authors.row(user_id), config['FAVOURITE_WEIGHT'])
+
+        co_fans, overlap = np.unique(
+            self.fans.gather(self.favourites.row(user_id)),
+            return_counts=True
+        )
+        keep = co_fans != user_id
+        co_fans, overlap = co_fans[keep], overlap[keep]
+        co_fans = co_fans[np.argsort(-overlap, kind='stable')]
+        add(
+            self.favourite_authors.gather(co_fans[:config['MAX_CO_FANS']]),
+            config['CO_FAVOURITE_WEIGHT']
+        )
+
+        for author in itertools.chain(following.tolist(), (user_id,)):
+            scores.pop(author, None)
+        return sorted(
+            scores.items(), key=lambda item: (-item[1], item[0])
+        )[:config['TOP_N']]
+
+
+def store(graph, user_ids):
+    with transaction.atomic():
+        AuthorSuggestion.objects.filter(user_id__in=user_ids).delete()
+        AuthorSuggestion.objects.bulk_create(
+            AuthorSuggestion(user_id=user_id, author_id=author, score=score)
+            for user_id in user_ids
+            for author, score in graph.suggest(user_id)
+        )
+
+
+def build(user_ids=None, batch_size=1000):
+    """
+    Пересчёт рекомендаций пользователей user_ids или всех пользователей
+    с подписками и избранным. Строки каждого пользователя заменяются
+    в транзакции его пакета, поэтому во время пересчёта у всех остаются
+    старые или уже новые рекомендации. Возвращает число обработанных.
+    """
+    graph = FollowGraph(user_ids)
+    rebuild = user_ids is None
+    if rebuild:
+        user_ids = graph.users().tolist()
+    for start in range(0, len(user_ids), batch_size):
+        store(graph, user_ids[start:start + batch_size])
+    if rebuild:
+        # Рекомендации тех, у кого не осталось ни подписок, ни избранного
+        current = set(user_ids)
+        outdated = [
+            user_id for user_id in AuthorSuggestion.objects.values_list(
+                'user_id', flat=True
+            ).distinct().order_by().iterator()
+            if user_id not in current
+        ]
+        for start in range(0, len(outdated), batch_size):
+            AuthorSuggestion.objects.filter(
+                user_id__in=outdated[start:start + batch_size]
+            ).delete()
+    return len(user_ids)
+
+
+def refresh_stale(batch_size=1000):
+    """Пересчёт для пользователей, чьи подписки изменились."""
+    user_ids = list(SuggestionRefresh.objects.values_list(
+        'user_id', flat=True
+    ))
+    if not user_ids:
+        return 0
+    build(user_ids, batch_size)
+    SuggestionRefresh.objects.filter(user_id__in=user_ids).delete()
+    return len(user_ids)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def mark_stale(sender, instance, **kwargs):
+    # Автор, на которого только что подписались, сразу пропадает из списка
+    AuthorSuggestion.objects.filter(
+        user_id=instance.user_id, author_id=instance.following_id
+    ).delete()
+    transaction.on_commit(partial(mark_for_refresh, instance.user_id))
+
+
+def mark_for_refresh(user_id):
+    # Подписка могла быть удалена вместе с самим пользователем
+    if User.objects.filter(pk=user_id).exists():
+        SuggestionRefresh.objects.bulk_create(
+            [SuggestionRefresh(user_id=user_id)], ignore_conflicts=True
+        )
@@ -1,16 +1,27 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.contrib.auth.hashers import check_password
 from django.shortcuts import get_object_or_404
 from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-
-from recipes.models import Follow
-from api.serializers import FollowSerializer
-
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.models import AuthorSuggestion, ChangeLogEntry, Follow, Recipe
+from api import identity
+from api.deletion import schedule_deletion
+from api.events import publish
+from api.mixins import ReplicaReadMixin
+from api.read_models import SubscriptionReadModel
+from api.serializers import FollowSerializer, RecipeGetSerializer
+from api.utils import annotate_viewer_flags
+
+from .cache import get_following, get_profile, get_profiles
+from .feed import get_feed_ids
+from .hashing import check_password, set_password
 from .serializers import (ChangePasswordSerializer, CustomUserSerializer,
                           UserLoginSerializer)
 
@@ -24,6 +35,17 @@ class FollowViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
     def get_queryset(self):
         return Follow.objects.filter(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        """Список через модель чтения, без экземпляров Follow и User."""
+        read_model = SubscriptionReadModel(self.get_serializer_context())
+        author_ids = self.filter_queryset(self.get_queryset()).values_list(
+            'following_id', flat=True
+        )
+        page = self.paginate_queryset(author_ids)
+        if page is not None:
+            return self.get_paginated_response(read_model.render(page))
+        return Response(read_model.render(list(author_ids)))
+
 
 class FollowActionViewSet(
     viewsets.GenericViewSet,
@@ -34,22 +56,22 @@ class FollowActionViewSet(
     serializer_class = FollowSerializer
 
     def perform_create(self, serializer):
-        serializer.save(
+        follow = serializer.save(
             user=self.request.user,
-            following=get_object_or_404(
-                User, pk=self.kwargs.get('id')
-            )
+            following=identity.get_object_or_404(User, self.kwargs.get('id'))
         )
+        publish(follow.user_id, ChangeLogEntry.FOLLOW, ChangeLogEntry.CREATE,
+                follow.following_id)
 
     def delete(self, request, *args, **kwargs):
         follow = get_object_or_404(
             Follow,
             user=self.request.user,
-            following=get_object_or_404(
-                User, pk=self.kwargs.get('id')
-            )
+            following=identity.get_object_or_404(User, self.kwargs.get('id'))
         )
         follow.delete()
+        publish(follow.user_id, ChangeLogEntry.FOLLOW, ChangeLogEntry.DELETE,
+                follow.following_id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def get_serializer_context(self):
@@ -58,7 +80,7 @@ class FollowActionViewSet(
         return context
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     pagination_class = LimitOffsetPagination
@@ -66,18 +88,23 @@ class UserViewSet(viewsets.ModelViewSet):
 
     lookup_field = 'id'
 
+    def perform_destroy(self, instance):
+        schedule_deletion(instance)
+
     def set_password(self, request, *args, **kwargs):
         serializer = ChangePasswordSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         current_user = self.request.user
 
         if not check_password(
-                serializer.validated_data['current_password'],
-                current_user.password
+                current_user,
+                serializer.validated_data['current_password']
         ):
             return Response(['Неверный пароль'], status=status.HTTP_401_UNAUTHORIZED)
 
-        current_user.set_password(serializer.validated_data['new_password'])
+        set_password(
+            current_user, serializer.validated_data['new_password']
+        )
         current_user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -92,9 +119,67 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(
+        detail=False,
+        methods=('GET',),
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def feed(self, request):
+        """
+        Лента новых рецептов авторов из подписок. Постраничный вывод
+        по ключу: ?cursor=<id последнего рецепта>&limit=<размер>.
+        """
+        try:
+            cursor = request.query_params.get('cursor')
+            cursor = int(cursor) if cursor else None
+            limit = min(int(request.query_params.get('limit') or 10), 100)
+        except ValueError:
+            return Response(
+                {'errors': 'cursor и limit должны быть числами'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        recipe_ids = get_feed_ids(
+            request.user, get_following(request), cursor, max(limit, 1)
+        )
+        recipes = annotate_viewer_flags(
+            Recipe.objects.filter(id__in=recipe_ids), request.user
+        ).only('id', 'version', 'author_id')
+        serializer = RecipeGetSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        )
+        next_url = None
+        if len(recipe_ids) == limit:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'cursor', recipe_ids[-1]
+            )
+        return Response({'next': next_url, 'results': serializer.data})
+
+    @action(
+        detail=False,
+        methods=('GET',),
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def suggestions(self, request):
+        """Рекомендованные авторы из заранее посчитанной таблицы."""
+        top_n = settings.AUTHOR_SUGGESTIONS['TOP_N']
+        suggestions = list(AuthorSuggestion.objects.filter(
+            user=request.user
+        ).values_list('author_id', 'score')[:top_n])
+        profiles = get_profiles([author_id for author_id, _ in suggestions])
+        data = []
+        for author_id, score in suggestions:
+            if author_id not in profiles:
+                continue
+            author = self.get_serializer(author_id).data
+            author['score'] = score
+            data.append(author)
+        return Response(data, status=status.HTTP_200_OK)
+
     def retrieve(self, request, *args, **kwargs):
-        user = get_object_or_404(User, pk=kwargs.get('id'))
-        serializer = self.get_serializer(user)
+        user_id = kwargs.get('id')
+        if not user_id.isdigit() or get_profile(int(user_id)) is None:
+            raise NotFound
+        serializer = self.get_serializer(int(user_id))
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -102,6 +187,7 @@ class UserLoginViewSet(
     viewsets.GenericViewSet, mixins.CreateModelMixin,
 ):
     permission_classes = (AllowAny,)
+    throttle_scope = 'login'
 
     serializer_class = UserLoginSerializer
 
@@ -120,7 +206,7 @@ class UserLoginViewSet(
             )
 
         user = get_object_or_404(User, email=email)
-        if not check_password(password, user.password):
+        if not check_password(user, password):
             return Response(
                 ['Неверный пароль'],
                 status=status.HTTP_400_BAD_REQUEST